@@ -1,133 +1,73 @@
-from flask import Flask, render_template, request, jsonify, make_response
+from flask import Flask, render_template, request, jsonify, make_response, abort
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime, timedelta
-import re
+import math
+import os
+
+from job_codec import (MSGPACK_TYPES, SpecFormatError, decode_body, encode_msgpack, is_supported, msgpack,
+                       spec_codes)
+from job_history import DEFAULT_PERCENTILE, get_history, right_size
+from job_lint import lint_script
+from job_registry import cluster_names, get_registry, is_mpi_command, needs_srun
+from job_resilience import resilience_directives, resilient_execution
+from job_staging import staging_lines
+from job_schema import JobSpecSchema, WEB_FIELD_NAMES, error_messages, has_errors
+from job_telemetry import instrument_steps, telemetry_setup, telemetry_summary
+from job_throttle import PreviewTracker, RateLimiter, RequestCoalescer
+from job_units import slurm_size
 
 app = Flask(__name__)
 
+# Behind a reverse proxy every request arrives from the proxy; with
+# NREL_JOBGEN_PROXIES trusted hops the client address comes from X-Forwarded-For
+if int(os.environ.get('NREL_JOBGEN_PROXIES', '0')):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ['NREL_JOBGEN_PROXIES']))
+
 class JobScriptGenerator:
     """Generator for NREL HPC Slurm job scripts"""
     
-    def __init__(self):
-        self.partitions = {
-            'debug': {'max_time': '01:00:00', 'description': 'Debug partition (1 hour max, 1 job per user, max 2 nodes)'},
-            'short': {'max_time': '04:00:00', 'description': 'Jobs with walltimes <= 4 hours (2240 nodes total)'},
-            'standard': {'max_time': '2-00:00:00', 'description': 'Jobs with walltimes <= 2 days (2240 nodes, 1050 per user)'},
-            'long': {'max_time': '10-00:00:00', 'description': 'Jobs with walltimes > 2 days (430 nodes, 215 per user)'},
-            'shared': {'max_time': '2-00:00:00', 'description': 'Shared nodes (128 nodes, half partition per user)'},
-            'sharedl': {'max_time': '10-00:00:00', 'description': 'Shared nodes for long jobs (32 nodes, 16 per user)'},
-            'hbw': {'max_time': '2-00:00:00', 'description': 'High bandwidth nodes with dual NICs (min 2 nodes, 512 total)'},
-            'hbwl': {'max_time': '10-00:00:00', 'description': 'High bandwidth nodes for long jobs (128 nodes, 64 per user)'},
-            'medmem': {'max_time': '10-00:00:00', 'description': 'Medium memory nodes with 1TB RAM (64 nodes, 32 per user)'},
-            'bigmem': {'max_time': '2-00:00:00', 'description': 'Big memory nodes with 2TB RAM (10 nodes, 4 per user)'},
-            'bigmeml': {'max_time': '10-00:00:00', 'description': 'Big memory nodes for long jobs (4 nodes, 2 per user)'},
-            'nvme': {'max_time': '2-00:00:00', 'description': 'Nodes with 1.7TB NVMe local drives (256 nodes, 128 per user)'},
-            'gpu-h100': {'max_time': '2-00:00:00', 'description': 'GPU nodes with 4 NVIDIA H100 GPUs (156 nodes total)'},
-            'gpu-h100s': {'max_time': '04:00:00', 'description': 'GPU nodes for short jobs <= 4 hours (156 nodes total)'},
-            'gpu-h100l': {'max_time': '10-00:00:00', 'description': 'GPU nodes for long jobs > 2 days (39 nodes total)'}
-        }
+    def __init__(self, registry=None):
+        self.registry = registry or get_registry()
+        self.schema = JobSpecSchema(self.registry, field_names=WEB_FIELD_NAMES)
         
         self.qos_options = {
             'normal': {'multiplier': 1.0, 'description': 'Normal priority'},
             'high': {'multiplier': 2.0, 'description': 'High priority (2x AU cost)'},
             'standby': {'multiplier': 0.0, 'description': 'Standby (free, runs when idle)'}
         }
-        
-        self.application_templates = {
-            'general': {
-                'name': 'General Template',
-                'description': 'Standard job script template for general HPC workloads',
-                'modules': [],
-                'environment': [],
-                'default_command': 'echo "Replace this with your command"',
-                'mpi_flags': [],
-                'recommended_partition': None,
-                'partition_reason': None
-            },
-            'gaussian': {
-                'name': 'Gaussian Template',
-                'description': 'Optimized for Gaussian16 quantum chemistry calculations',
-                'modules': ['gaussian'],
-                'environment': [
-                    'export GAUSS_SCRDIR=$TMPDIR',
-                    'export GAUSS_MEMDEF=2GB'
-                ],
-                'default_command': 'g16_nrel < input.gjf > output.log',
-                'mpi_flags': [],
-                'recommended_partition': 'nvme',
-                'partition_reason': 'I/O intensive calculations benefit from fast local storage'
-            },
-            'lammps': {
-                'name': 'LAMMPS Template',
-                'description': 'Configured for LAMMPS molecular dynamics simulations',
-                'modules': ['lammps/080223-intel-mpich'],
-                'environment': [],
-                'default_command': 'lmp -in input.in',
-                'mpi_flags': ['--mpi=pmi2'],
-                'recommended_partition': 'hbw',
-                'partition_reason': 'High-bandwidth partition recommended for >10 nodes'
-            },
-            'ansys': {
-                'name': 'ANSYS Template',
-                'description': 'Setup for ANSYS Fluent and Mechanical simulations',
-                'modules': ['ansys'],
-                'environment': [
-                    'export FLUENT_AFFINITY=0',
-                    'export SLURM_ENABLED=1',
-                    'export SCHEDULER_TIGHT_COUPLING=13',
-                    'export I_MPI_HYDRA_BOOTSTRAP=slurm',
-                    'scontrol show hostnames > nodelist'
-                ],
-                'default_command': 'fluent 3ddp -g -t$SLURM_NPROCS -mpi=intel -cnf=$PWD/nodelist -i journal.jou',
-                'mpi_flags': [],
-                'recommended_partition': None,
-                'partition_reason': None
-            },
-            'comsol': {
-                'name': 'COMSOL Template',
-                'description': 'Optimized for COMSOL Multiphysics finite element analysis',
-                'modules': ['comsol'],
-                'environment': [
-                    'export SLURM_MPI_TYPE=pmi2'
-                ],
-                'default_command': 'comsol batch -np $SLURM_NPROCS -inputfile input.mph -outputfile output',
-                'mpi_flags': [],
-                'recommended_partition': None,
-                'partition_reason': None
-            }
-        }
+
+    @property
+    def partitions(self):
+        return self.registry.partitions
+
+    @property
+    def application_templates(self):
+        return self.registry.application_templates
+    
+    def spec_codes(self):
+        """Code tables for enum-coded spec fields, rebuilt when the registry changes"""
+        names = (tuple(self.partitions), tuple(self.qos_options), tuple(self.application_templates))
+        if getattr(self, '_spec_codes_names', None) != names:
+            self._spec_codes = spec_codes(*names)
+            self._spec_codes_names = names
+        return self._spec_codes
+    
+    def history_suggestion(self, data):
+        """Walltime/memory suggestion from the sacct history in $NREL_JOBGEN_HISTORY, or None"""
+        path = os.environ.get('NREL_JOBGEN_HISTORY')
+        if not path or not os.path.exists(path):
+            return None
+        history = get_history(path)
+        return history.suggest(data.get('job_name'), data.get('application_template') or 'general',
+                               int(data.get('percentile') or DEFAULT_PERCENTILE))
+    
+    def validate_spec(self, data):
+        """Validate user inputs, returning structured field-addressed errors"""
+        return self.schema.validate(data)
     
     def validate_inputs(self, data):
         """Validate user inputs"""
-        errors = []
-        
-        # Required fields
-        if not data.get('account'):
-            errors.append('Account/Project handle is required')
-        
-        if not data.get('walltime'):
-            errors.append('Walltime is required')
-        
-        # Validate walltime format
-        walltime = data.get('walltime', '')
-        if not re.match(r'^\d{1,2}:\d{2}:\d{2}$|^\d+-\d{1,2}:\d{2}:\d{2}$|^\d+$', walltime):
-            errors.append('Invalid walltime format. Use HH:MM:SS, D-HH:MM:SS, or minutes')
-        
-        # Validate nodes and tasks
-        try:
-            nodes = int(data.get('nodes', 1))
-            if nodes < 1:
-                errors.append('Number of nodes must be at least 1')
-        except ValueError:
-            errors.append('Invalid number of nodes')
-        
-        try:
-            ntasks = data.get('ntasks')
-            if ntasks and int(ntasks) < 1:
-                errors.append('Number of tasks must be at least 1')
-        except ValueError:
-            errors.append('Invalid number of tasks')
-        
-        return errors
+        return error_messages(self.validate_spec(data))
     
     def generate_script(self, data):
         """Generate the sbatch script"""
@@ -146,6 +86,8 @@ class JobScriptGenerator:
         script_lines.append(f'# Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
         script_lines.append(f'# Job: {data.get("job_name", "my_job")}')
         script_lines.append(f'# Application: {template_config["description"]}')
+        if self.registry.cluster:
+            script_lines.append(f'# Cluster: {self.registry.cluster_name}')
         script_lines.append('')
         
         # Required SBATCH directives
@@ -156,6 +98,10 @@ class JobScriptGenerator:
         if data.get('job_name'):
             script_lines.append(f'#SBATCH --job-name={data["job_name"]}')
         
+        # Lets later right-sizing find this job's history by template
+        if data.get('right_size'):
+            script_lines.append(f'#SBATCH --comment=template={app_template}')
+        
         # Partition
         if data.get('partition'):
             script_lines.append(f'#SBATCH --partition={data["partition"]}')
@@ -178,17 +124,18 @@ class JobScriptGenerator:
         
         # Memory
         if data.get('memory'):
-            script_lines.append(f'#SBATCH --mem={data["memory"]}')
+            script_lines.append(f'#SBATCH --mem={slurm_size(data["memory"])}')
         elif data.get('memory_per_cpu'):
-            script_lines.append(f'#SBATCH --mem-per-cpu={data["memory_per_cpu"]}')
+            script_lines.append(f'#SBATCH --mem-per-cpu={slurm_size(data["memory_per_cpu"])}')
         
         # GPUs
-        if data.get('gpus'):
-            script_lines.append(f'#SBATCH --gpus={data["gpus"]}')
+        gpu_plan = self.schema.gpu_plan(data)
+        if gpu_plan:
+            script_lines.extend(gpu_plan.directives)
         
         # Local scratch
         if data.get('tmp_storage'):
-            script_lines.append(f'#SBATCH --tmp={data["tmp_storage"]}')
+            script_lines.append(f'#SBATCH --tmp={slurm_size(data["tmp_storage"])}')
         
         # Email notifications
         if data.get('email'):
@@ -210,6 +157,12 @@ class JobScriptGenerator:
         if data.get('error_file') and data.get('error_file') != output_file:
             script_lines.append(f'#SBATCH --error={data["error_file"]}')
         
+        # Checkpoint/requeue mode
+        resilient = data.get('resilient')
+        if resilient:
+            lead_time = self.schema.checkpoint_lead_time(data)
+            script_lines.extend(resilience_directives(lead_time))
+        
         script_lines.append('')
         
         # Job information header
@@ -225,7 +178,7 @@ class JobScriptGenerator:
         ])
         
         # Module loading (combine template modules with user modules)
-        all_modules = template_config.get('modules', [])
+        all_modules = list(template_config.get('modules', []))
         if data.get('modules'):
             user_modules = [m.strip() for m in data.get('modules', '').split('\n') if m.strip()]
             all_modules.extend(user_modules)
@@ -238,7 +191,7 @@ class JobScriptGenerator:
             script_lines.append('')
         
         # Environment setup (combine template environment with user setup)
-        all_env = template_config.get('environment', [])
+        all_env = list(template_config.get('environment', []))
         if data.get('environment_setup'):
             user_env = [line.strip() for line in data.get('environment_setup', '').split('\n') if line.strip()]
             all_env.extend(user_env)
@@ -249,11 +202,32 @@ class JobScriptGenerator:
                 script_lines.append(line)
             script_lines.append('')
         
+        # GPU setup (MPS for tasks sharing a GPU)
+        if gpu_plan and gpu_plan.environment:
+            script_lines.append('# GPU setup')
+            script_lines.extend(gpu_plan.environment)
+            script_lines.append('')
+        
+        # Stage inputs onto node-local storage and results back on exit
+        if data.get('stage_in') or data.get('stage_out'):
+            script_lines.extend(staging_lines(data.get('stage_in'), data.get('stage_out'), int(data.get('nodes') or 1),
+                                              gpu_plan.on_exit if gpu_plan else ()))
+            script_lines.append('')
+        
+        # Step timing and resource sampling
+        telemetry = data.get('telemetry')
+        if telemetry:
+            script_lines.extend(telemetry_setup(output_file, data.get('telemetry_interval'), bool(gpu_plan)))
+            script_lines.append('')
+        
         # Job commands
         script_lines.append('# Job execution')
+        execution_start = len(script_lines)
         
         # Generate srun command if applicable
         srun_cmd = self._generate_srun_command(data, template_config)
+        if srun_cmd and gpu_plan:
+            srun_cmd = ' '.join([srun_cmd] + gpu_plan.srun_flags + ([gpu_plan.launcher] if gpu_plan.launcher else []))
         
         if data.get('commands'):
             if srun_cmd:
@@ -261,14 +235,14 @@ class JobScriptGenerator:
             for line in data.get('commands', '').split('\n'):
                 line = line.strip()
                 if line:
-                    if srun_cmd and self._is_mpi_command(line, app_template):
+                    if srun_cmd and self._needs_srun(line, app_template):
                         script_lines.append(f'{srun_cmd} {line}')
                     else:
                         script_lines.append(line)
         else:
             # Use template default command if no user commands provided
             default_cmd = template_config.get('default_command', 'echo "Add your commands here"')
-            if srun_cmd and self._is_mpi_command(default_cmd, app_template):
+            if srun_cmd and self._needs_srun(default_cmd, app_template):
                 script_lines.append(f'{srun_cmd} {default_cmd}')
             else:
                 script_lines.append(default_cmd)
@@ -281,14 +255,26 @@ class JobScriptGenerator:
                     '# For serial programs within the allocation: your_program'
                 ])
         
+        epilogue = []
+        if telemetry:
+            script_lines[execution_start:], labels = instrument_steps(script_lines[execution_start:])
+            epilogue = telemetry_summary(labels)
+        
         script_lines.append('')
         script_lines.append('echo "Job completed at: $(date)"')
         
+        if resilient:
+            script_lines[execution_start:] = resilient_execution(
+                script_lines[execution_start:], template_config, lead_time,
+                lambda line: self._is_mpi_command(line, app_template), epilogue)
+        elif epilogue:
+            script_lines[-1:-1] = epilogue + ['']
+        
         return '\n'.join(script_lines)
     
     def _generate_srun_command(self, data, template_config=None):
         """Generate srun command with appropriate parameters"""
-        nodes = int(data.get('nodes', 1))
+        nodes = int(data.get('nodes') or 1)
         ntasks = data.get('ntasks')
         ntasks_per_node = data.get('ntasks_per_node')
         cpus_per_task = data.get('cpus_per_task')
@@ -319,60 +305,247 @@ class JobScriptGenerator:
     
     def _is_mpi_command(self, command, app_template='general'):
         """Check if a command appears to be an MPI/parallel program"""
-        # Application-specific MPI command detection
-        app_mpi_indicators = {
-            'general': ['python', 'mpirun', 'mpiexec', './', 'vasp', 'openfoam'],
-            'gaussian': ['g16', 'g09'],  # Gaussian handles parallelization internally
-            'lammps': ['lmp'],
-            'ansys': ['fluent', 'ansys'],
-            'comsol': ['comsol']
-        }
-        
-        indicators = app_mpi_indicators.get(app_template, app_mpi_indicators['general'])
-        cmd_lower = command.lower()
-        
-        # Special case: Gaussian uses g16_nrel which doesn't need srun
-        if app_template == 'gaussian' and 'g16_nrel' in cmd_lower:
-            return False
-            
-        return any(indicator in cmd_lower for indicator in indicators)
+        template_config = self.application_templates.get(app_template, self.application_templates['general'])
+        return is_mpi_command(template_config, command)
+    
+    def _needs_srun(self, command, app_template='general'):
+        """Check if a command should be wrapped in srun (not already launched)"""
+        template_config = self.application_templates.get(app_template, self.application_templates['general'])
+        return needs_srun(template_config, command)
+
+# One generator per cluster profile, each with its registry and compiled schema
+# loaded once at startup, so picking a cluster per request is a dict lookup
+generators = {name: JobScriptGenerator(get_registry(cluster=name)) for name in cluster_names()}
+generator = generators[get_registry().cluster_name]
+
+def generator_for(data):
+    """Generator for the cluster a spec names; unknown clusters are reported by validation"""
+    cluster = data.get('cluster') if isinstance(data, dict) else None
+    return generators.get(cluster, generator) if isinstance(cluster, str) else generator
+
+def query_generator():
+    """Generator for the ?cluster= query parameter, for requests without a spec"""
+    return generators.get(request.args.get('cluster', ''), generator)
 
-generator = JobScriptGenerator()
+# Pick up template/partition edits without restarting the workers
+if os.environ.get('NREL_JOBGEN_WATCH_REGISTRY', '1') != '0':
+    for cluster_generator in generators.values():
+        cluster_generator.registry.watch(float(os.environ.get('NREL_JOBGEN_WATCH_INTERVAL', '2')))
 
 @app.route('/')
 def index():
     """Main page with job script form"""
+    selected = query_generator()
     return render_template('index.html', 
-                         partitions=generator.partitions,
-                         qos_options=generator.qos_options,
-                         application_templates=generator.application_templates)
+                         clusters={name: gen.registry.cluster_description for name, gen in generators.items()},
+                         cluster=selected.registry.cluster_name,
+                         partitions=selected.partitions,
+                         qos_options=selected.qos_options,
+                         application_templates=selected.application_templates)
 
-@app.route('/generate', methods=['POST'])
-def generate():
-    """Generate job script from form data"""
-    data = request.get_json()
+# Off by default unless the proxy hops are configured: behind an unconfigured
+# proxy every client has the proxy's address and would share one bucket
+limiter = RateLimiter(float(os.environ.get('NREL_JOBGEN_RATE_LIMIT',
+                                           '5' if 'NREL_JOBGEN_PROXIES' in os.environ else '0')),
+                      float(os.environ.get('NREL_JOBGEN_RATE_BURST', '20')))
+coalescer = RequestCoalescer()
+previews = PreviewTracker()
+
+def throttled():
+    """429 response when the client is over its request rate, otherwise None"""
+    allowed, retry_after = limiter.allow(request.remote_addr)
+    if allowed:
+        return None
+    response = jsonify({'success': False, 'errors': ['Too many requests, please slow down']})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+def preview_key():
+    """(client page, sequence number) of a live-preview request, or None"""
+    page = request.headers.get('X-Preview-Id')
+    try:
+        seq = int(request.headers.get('X-Preview-Seq', ''))
+    except ValueError:
+        return None
+    return (f'{request.remote_addr}/{page}', seq) if page else None
+
+def request_specs():
+    """Decode the request body by Content-Type: a spec, a list of specs or a columnar batch"""
+    if not is_supported(request.mimetype):
+        abort(415)
+    return decode_body(request.get_data(), request.mimetype, query_generator().spec_codes())
+
+def request_spec():
+    """Decode a request body that must hold exactly one spec"""
+    data = request_specs()
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]
+    if not isinstance(data, dict):
+        raise SpecFormatError('Expected one job spec; send several to /generate/batch')
+    return data
+
+def respond(payload, status=200):
+    """Reply with msgpack if the client prefers it, otherwise JSON"""
+    if msgpack is not None and request.accept_mimetypes.best_match(['application/json', *MSGPACK_TYPES]) in MSGPACK_TYPES:
+        return make_response(encode_msgpack(payload), status, {'Content-Type': MSGPACK_TYPES[0]})
+    return jsonify(payload), status
+
+@app.errorhandler(SpecFormatError)
+def spec_format_error(e):
+    return jsonify({'success': False, 'errors': [str(e)]}), 400
+
+def superseded():
+    return jsonify({'success': False, 'superseded': True, 'errors': ['Superseded by a newer preview']}), 409
+
+def generate_response(data):
+    """Right-size, place, validate and render a spec; returns (payload, status)"""
+    generator = generator_for(data)
+    right_sized = []
+    if data.get('right_size'):
+        try:
+            right_sized = right_size(data, generator.history_suggestion(data), time_key='walltime')
+        except ValueError as e:
+            return {'success': False, 'errors': [str(e)]}, 400
+    
+    if data.get('auto_partition'):
+        generator.schema.auto_partition(data)
     
     # Validate inputs
-    errors = generator.validate_inputs(data)
-    if errors:
-        return jsonify({'success': False, 'errors': errors}), 400
+    field_errors = generator.validate_spec(data)
+    if has_errors(field_errors):
+        return {'success': False, 'errors': error_messages(field_errors), 'field_errors': field_errors}, 400
     
     # Generate script
     try:
         script = generator.generate_script(data)
-        return jsonify({'success': True, 'script': script})
+        return {'success': True, 'script': script, 'warnings': field_errors,
+                'partition': data.get('partition'),
+                'right_sized': [{'field': key, 'requested': old, 'applied': new}
+                                for key, old, new in right_sized]}, 200
     except Exception as e:
-        return jsonify({'success': False, 'errors': [str(e)]}), 500
+        return {'success': False, 'errors': [str(e)]}, 500
+
+@app.route('/generate', methods=['POST'])
+def generate():
+    """Generate job script from form data"""
+    limited = throttled()
+    if limited:
+        return limited
+    data = request_spec()
+    
+    # Drop previews the same page has already replaced with a newer one
+    preview = preview_key()
+    if preview and not previews.start(*preview):
+        return superseded()
+    
+    # Identical specs in flight (many users on the default form) share one render
+    (payload, status), _ = coalescer.run(coalescer.key(data), lambda: generate_response(data))
+    if preview and previews.is_stale(*preview):
+        return superseded()
+    return respond(payload, status)
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """Generate scripts for a list of specs, a columnar batch or a binary batch"""
+    limited = throttled()
+    if limited:
+        return limited
+    specs = request_specs()
+    if isinstance(specs, dict):
+        specs = [specs]
+    if not isinstance(specs, list):
+        raise SpecFormatError('Expected a list of job specs')
+    
+    results = []
+    for index, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            results.append({'index': index, 'success': False, 'errors': ['Job spec must be an object']})
+            continue
+        payload, _ = generate_response(spec)
+        results.append({'index': index, **payload})
+    
+    return respond({'success': True, 'results': results})
+
+@app.route('/spec-codes')
+def get_spec_codes():
+    """Code tables for the enum-coded fields of the binary spec format"""
+    return jsonify({'success': True, 'codes': query_generator().spec_codes()})
+
+@app.route('/validate', methods=['POST'])
+def validate():
+    """Validate one job spec or a list of job specs without generating scripts"""
+    data = request_specs()
+    specs = data if isinstance(data, list) else [data]
+    
+    results = []
+    for index, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            errors = [{'field': None, 'code': 'type', 'message': 'Job spec must be an object', 'severity': 'error'}]
+        else:
+            errors = generator_for(spec).validate_spec(spec)
+        results.append({'index': index, 'valid': not has_errors(errors), 'errors': errors})
+    
+    return respond({'success': True, 'results': results})
+
+@app.route('/lint', methods=['POST'])
+def lint():
+    """Check a batch script ({"script": ...}) or the script generated for a spec for common mistakes"""
+    data = request_spec()
+    generator = generator_for(data)
+    script = data.get('script')
+    if not isinstance(script, str):
+        field_errors = generator.validate_spec(data)
+        if has_errors(field_errors):
+            return jsonify({'success': False, 'errors': error_messages(field_errors),
+                            'field_errors': field_errors}), 400
+        script = generator.generate_script(data)
+    
+    findings = lint_script(script, generator.application_templates, generator.registry.cluster_name)
+    return respond({'success': True, 'valid': not has_errors(findings), 'findings': findings})
+
+@app.route('/fit', methods=['POST'])
+def fit():
+    """Normalise memory/scratch sizes and check them against partition capacity"""
+    data = request_spec()
+    generator = generator_for(data)
+    # Sizes of the wrong JSON type never reach the size parser
+    type_errors = [e for e in generator.validate_spec(data) if e['code'] == 'type']
+    if type_errors:
+        return jsonify({'success': False, 'errors': error_messages(type_errors),
+                        'field_errors': type_errors}), 400
+    try:
+        report = generator.schema.fit_report(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'errors': [str(e)]}), 400
+    return jsonify({'success': True, **report})
+
+@app.route('/rightsize', methods=['POST'])
+def rightsize():
+    """Suggest walltime and memory from the job history for a job name/template"""
+    data = request_spec()
+    try:
+        suggestion = generator_for(data).history_suggestion(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'errors': [str(e)]}), 400
+    if suggestion is None:
+        return jsonify({'success': False, 'errors': ['No job history available for this job']}), 404
+    return jsonify({'success': True, 'suggestion': suggestion})
 
 @app.route('/download', methods=['POST'])
 def download():
     """Download generated script as file"""
-    data = request.get_json()
+    limited = throttled()
+    if limited:
+        return limited
+    data = request_spec()
+    generator = generator_for(data)
     
     # Validate and generate script
-    errors = generator.validate_inputs(data)
-    if errors:
-        return jsonify({'success': False, 'errors': errors}), 400
+    field_errors = generator.validate_spec(data)
+    if has_errors(field_errors):
+        return jsonify({'success': False, 'errors': error_messages(field_errors),
+                        'field_errors': field_errors}), 400
     
     try:
         script = generator.generate_script(data)
@@ -388,7 +561,7 @@ def download():
 @app.route('/templates/<template_name>')
 def get_template(template_name):
     """Get application template configuration"""
-    template = generator.application_templates.get(template_name)
+    template = query_generator().application_templates.get(template_name)
     if template:
         return jsonify({'success': True, 'template': template})
     else:
@@ -473,7 +646,6 @@ def examples():
     return render_template('examples.html', examples=examples)
 
 if __name__ == '__main__':
-    import os
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
     app.run(debug=debug, host='0.0.0.0', port=port)
\ No newline at end of file
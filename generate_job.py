@@ -7,94 +7,62 @@ Generate Slurm batch scripts for NREL Kestrel HPC system from the command line.
 import argparse
 import sys
 from datetime import datetime
-import re
+import json
 import os
+import time
+
+from job_campaign import (Manifest, atomic_write, coerce_spec, expand_sweep, file_version,
+                          input_hash, iter_specs, parse_sweep)
+from job_fingerprint import content_hash, fingerprint, same_content
+from job_history import DEFAULT_PERCENTILE, get_history, right_size
+from job_import import import_scripts
+from job_lint import format_findings, lint_script
+from job_parallel import PARALLEL_THRESHOLD, PROGRESS_INTERVAL, ScriptWriter, ordered_map, peek
+from job_registry import cluster_names, get_registry, is_mpi_command, needs_srun, parse_document
+from job_resilience import resilience_directives, resilient_execution
+from job_staging import staging_lines, staging_tmp_size
+from job_schema import JobSpecSchema, QOS_OPTIONS, WALLTIME_RE, has_errors
+from job_telemetry import instrument_steps, telemetry_setup, telemetry_summary
+from job_units import slurm_size
+from job_workflow import WorkflowError, compile_workflow
+
+# Modules whose code shapes the rendered script text; --incremental reuses
+# cached fingerprints only while none of them has changed
+SCRIPT_MODULES = tuple(os.path.join(os.path.dirname(os.path.abspath(__file__)), name) for name in (
+    'generate_job.py', 'job_gpu.py', 'job_lint.py', 'job_registry.py', 'job_resilience.py',
+    'job_schema.py', 'job_staging.py', 'job_telemetry.py', 'job_units.py'))
 
 class JobScriptCLI:
-    def __init__(self):
-        self.partitions = {
-            'debug': {'max_time': '01:00:00', 'description': 'Debug partition (1 hour max, 1 job per user, max 2 nodes)'},
-            'short': {'max_time': '04:00:00', 'description': 'Jobs with walltimes <= 4 hours (2240 nodes total)'},
-            'standard': {'max_time': '2-00:00:00', 'description': 'Jobs with walltimes <= 2 days (2240 nodes, 1050 per user)'},
-            'long': {'max_time': '10-00:00:00', 'description': 'Jobs with walltimes > 2 days (430 nodes, 215 per user)'},
-            'shared': {'max_time': '2-00:00:00', 'description': 'Shared nodes (128 nodes, half partition per user)'},
-            'sharedl': {'max_time': '10-00:00:00', 'description': 'Shared nodes for long jobs (32 nodes, 16 per user)'},
-            'hbw': {'max_time': '2-00:00:00', 'description': 'High bandwidth nodes with dual NICs (min 2 nodes, 512 total)'},
-            'hbwl': {'max_time': '10-00:00:00', 'description': 'High bandwidth nodes for long jobs (128 nodes, 64 per user)'},
-            'medmem': {'max_time': '10-00:00:00', 'description': 'Medium memory nodes with 1TB RAM (64 nodes, 32 per user)'},
-            'bigmem': {'max_time': '2-00:00:00', 'description': 'Big memory nodes with 2TB RAM (10 nodes, 4 per user)'},
-            'bigmeml': {'max_time': '10-00:00:00', 'description': 'Big memory nodes for long jobs (4 nodes, 2 per user)'},
-            'nvme': {'max_time': '2-00:00:00', 'description': 'Nodes with 1.7TB NVMe local drives (256 nodes, 128 per user)'},
-            'gpu-h100': {'max_time': '2-00:00:00', 'description': 'GPU nodes with 4 NVIDIA H100 GPUs (156 nodes total)'},
-            'gpu-h100s': {'max_time': '04:00:00', 'description': 'GPU nodes for short jobs <= 4 hours (156 nodes total)'},
-            'gpu-h100l': {'max_time': '10-00:00:00', 'description': 'GPU nodes for long jobs > 2 days (39 nodes total)'}
-        }
-        
-        self.qos_options = ['normal', 'high', 'standby']
-        
-        self.application_templates = {
-            'general': {
-                'name': 'General Template',
-                'description': 'Standard job script template for general HPC workloads',
-                'modules': [],
-                'environment': [],
-                'default_command': 'echo "Replace this with your command"',
-                'mpi_flags': [],
-                'recommended_partition': None,
-                'partition_reason': None
-            },
-            'gaussian': {
-                'name': 'Gaussian Template',
-                'description': 'Optimized for Gaussian16 quantum chemistry calculations',
-                'modules': ['gaussian'],
-                'environment': [
-                    'export GAUSS_SCRDIR=$TMPDIR',
-                    'export GAUSS_MEMDEF=2GB'
-                ],
-                'default_command': 'g16_nrel < input.gjf > output.log',
-                'mpi_flags': [],
-                'recommended_partition': 'nvme',
-                'partition_reason': 'I/O intensive calculations benefit from fast local storage'
-            },
-            'lammps': {
-                'name': 'LAMMPS Template',
-                'description': 'Configured for LAMMPS molecular dynamics simulations',
-                'modules': ['lammps/080223-intel-mpich'],
-                'environment': [],
-                'default_command': 'lmp -in input.in',
-                'mpi_flags': ['--mpi=pmi2'],
-                'recommended_partition': 'hbw',
-                'partition_reason': 'High-bandwidth partition recommended for >10 nodes'
-            },
-            'ansys': {
-                'name': 'ANSYS Template',
-                'description': 'Setup for ANSYS Fluent and Mechanical simulations',
-                'modules': ['ansys'],
-                'environment': [
-                    'export FLUENT_AFFINITY=0',
-                    'export SLURM_ENABLED=1',
-                    'export SCHEDULER_TIGHT_COUPLING=13',
-                    'export I_MPI_HYDRA_BOOTSTRAP=slurm',
-                    'scontrol show hostnames > nodelist'
-                ],
-                'default_command': 'fluent 3ddp -g -t$SLURM_NPROCS -mpi=intel -cnf=$PWD/nodelist -i journal.jou',
-                'mpi_flags': [],
-                'recommended_partition': None,
-                'partition_reason': None
-            },
-            'comsol': {
-                'name': 'COMSOL Template',
-                'description': 'Optimized for COMSOL Multiphysics finite element analysis',
-                'modules': ['comsol'],
-                'environment': [
-                    'export SLURM_MPI_TYPE=pmi2'
-                ],
-                'default_command': 'comsol batch -np $SLURM_NPROCS -inputfile input.mph -outputfile output',
-                'mpi_flags': [],
-                'recommended_partition': None,
-                'partition_reason': None
-            }
-        }
+    def __init__(self, registry=None):
+        self.registry = registry or get_registry()
+        self.qos_options = list(QOS_OPTIONS)
+        self._schema = None
+        self._clusters = {}
+
+    @property
+    def partitions(self):
+        return self.registry.partitions
+
+    @property
+    def application_templates(self):
+        return self.registry.application_templates
+
+    @property
+    def schema(self):
+        if self._schema is None or self._schema.registry is not self.registry:
+            self._schema = JobSpecSchema(self.registry)
+        return self._schema
+
+    def for_cluster(self, name):
+        """The CLI for another cluster profile of this registry, built once per process
+        
+        Unknown names give this CLI; validating the spec reports them.
+        """
+        if not name or name == self.registry.cluster_name or name not in cluster_names(self.registry.path):
+            return self
+        if name not in self._clusters:
+            self._clusters[name] = JobScriptCLI(get_registry(self.registry.path, name))
+        return self._clusters[name]
 
     def create_parser(self):
         parser = argparse.ArgumentParser(
@@ -104,7 +72,7 @@ class JobScriptCLI:
 Examples:
   %(prog)s --account csc000 --time 01:00:00 --job-name my_job
   %(prog)s -A csc000 -t 2:00:00 -J test --nodes 2 --ntasks 64
-  %(prog)s --account csc000 --time 30 --partition debug --gpus 1
+  %(prog)s --account csc000 --time 30 --partition gpu-h100 --gpus 1
   %(prog)s --interactive  # Interactive mode
             """
         )
@@ -130,6 +98,8 @@ Examples:
                           help='Partition: ' + ', '.join(self.partitions.keys()))
         parser.add_argument('--qos', choices=self.qos_options,
                           help='Quality of Service: ' + ', '.join(self.qos_options))
+        parser.add_argument('--array', '-a', type=str,
+                          help='Job array index specification (e.g., 1-100 or 0-99%%10)')
         
         # Resource requests
         parser.add_argument('--nodes', '-N', type=int, default=1,
@@ -146,8 +116,38 @@ Examples:
                           help='Memory per CPU (e.g., 2GB)')
         parser.add_argument('--gpus', '-G', type=int,
                           help='Number of GPUs')
+        parser.add_argument('--mps', action='store_true',
+                          help='When tasks outnumber GPUs, share each GPU between them through CUDA MPS')
         parser.add_argument('--tmp', type=str,
                           help='Local scratch storage (e.g., 100GB)')
+        parser.add_argument('--resilient', action='store_true',
+                          help='Checkpoint/requeue mode: signal the job before its time limit, checkpoint '
+                               'the application, requeue and resume from the checkpoint')
+        parser.add_argument('--checkpoint-size', type=str,
+                          help='Size of one checkpoint (e.g., 200GB); sets how early --resilient jobs are '
+                               'signalled (default: template estimate or the job memory)')
+        parser.add_argument('--telemetry', action='store_true',
+                          help='Time every command, sample sstat (and GPUs) during the job and write a '
+                               'JSON efficiency summary next to the output file')
+        parser.add_argument('--telemetry-interval', type=int, metavar='SECONDS',
+                          help='Seconds between --telemetry samples (default: 30)')
+        parser.add_argument('--stage-in', type=str, nargs='+', metavar='PATH',
+                          help='Files, directories or globs to copy to node-local storage on every node '
+                               'before the commands run there (sizes --tmp automatically)')
+        parser.add_argument('--stage-out', type=str, nargs='+', metavar='PATH',
+                          help='Files or globs to copy back from node-local storage when the job exits, '
+                               'including on failure')
+        parser.add_argument('--history', type=str, metavar='SACCT_FILE',
+                          default=os.environ.get('NREL_JOBGEN_HISTORY'),
+                          help='Saved sacct -P output of past jobs; suggests --time/--mem from jobs with the same '
+                               'job name or template (default: $NREL_JOBGEN_HISTORY)')
+        parser.add_argument('--right-size', action='store_true',
+                          help='With --history, replace --time/--mem by the suggestion where it is tighter')
+        parser.add_argument('--percentile', type=int, default=DEFAULT_PERCENTILE,
+                          help=f'History percentile to size for (default: {DEFAULT_PERCENTILE})')
+        parser.add_argument('--auto-partition', action='store_true',
+                          help='Pick the smallest partition whose nodes fit --mem/--tmp/--gpus '
+                               '(replaces --partition only if it does not fit)')
         
         # Email notifications
         parser.add_argument('--mail-user', type=str,
@@ -164,6 +164,8 @@ Examples:
         # Job setup
         parser.add_argument('--modules', type=str, nargs='*',
                           help='Modules to load (space-separated)')
+        parser.add_argument('--environment', type=str, nargs='*', metavar='LINE',
+                          help='Environment setup lines run before the commands (e.g. "export OMP_NUM_THREADS=8")')
         parser.add_argument('--commands', type=str, nargs='*',
                           help='Commands to execute (space-separated)')
         parser.add_argument('--script-file', type=str,
@@ -176,6 +178,49 @@ Examples:
                           help='Submit job after generating script')
         parser.add_argument('--list-templates', action='store_true',
                           help='List available application templates')
+        parser.add_argument('--lint', type=str, nargs='*', metavar='SCRIPT',
+                          help='Check the generated script(s) for common mistakes; with SCRIPT files or '
+                               'directories, check existing scripts instead of generating one')
+        
+        # Batch mode
+        parser.add_argument('--batch', type=str, metavar='SPECS',
+                          help='Generate one script per job spec in a JSON Lines file (or JSON list); '
+                               'spec keys are option names, other options act as defaults')
+        parser.add_argument('--sweep', type=str, action='append', metavar='KEY=V1,V2,...',
+                          help='Generate one script per point of a parameter grid; repeat for more axes '
+                               '(e.g. --sweep nodes=1,2,4 --sweep partition=short,standard)')
+        parser.add_argument('--output-dir', type=str, default='.',
+                          help='Directory for batch-generated scripts (default: current directory)')
+        parser.add_argument('--validate-only', action='store_true',
+                          help='With --batch, only validate the specs and print errors as JSON lines')
+        parser.add_argument('--keep-duplicates', action='store_true',
+                          help='Write every script even if it duplicates another one apart from the job name')
+        parser.add_argument('--incremental', action='store_true',
+                          help='Only re-render and rewrite scripts whose inputs changed since the previous manifest')
+        
+        # Import existing scripts
+        parser.add_argument('--import', dest='import_paths', type=str, nargs='+', metavar='SCRIPT',
+                          help='Parse existing sbatch scripts (files or directories) into job specs, written '
+                               'as JSON Lines to stdout or --save for use with --batch')
+        parser.add_argument('--workers', type=int,
+                          help='Worker processes for --import and large --batch/--sweep runs '
+                               '(default: one per CPU)')
+        parser.add_argument('--chunk-size', type=int,
+                          help='Specs per work unit when --batch/--sweep runs on several workers (default: 250)')
+        
+        # Workflow mode
+        parser.add_argument('--workflow', type=str, metavar='FILE',
+                          help='Compile a workflow DAG (JSON/YAML/TOML) into stage scripts and a '
+                               'submit driver in --output-dir; other options act as defaults')
+        parser.add_argument('--no-hetjob', action='store_true',
+                          help='With --workflow, never merge sibling stages into heterogeneous jobs')
+        parser.add_argument('--registry', type=str,
+                          help='Directory of template/partition definitions '
+                               '(default: $NREL_JOBGEN_REGISTRY or ./registry)')
+        clusters = cluster_names(self.registry.path)
+        parser.add_argument('--cluster', choices=clusters,
+                          help='Cluster profile whose partitions, modules and MPI flags to use '
+                               f'(default: $NREL_JOBGEN_CLUSTER or {clusters[0]})')
         
         return parser
 
@@ -183,18 +228,12 @@ Examples:
         """Validate command line arguments"""
         errors = []
         
-        if not args.interactive:
-            if not args.account:
-                errors.append('--account is required')
-            if not args.time:
-                errors.append('--time is required')
-        
-        if args.time:
-            if not re.match(r'^\d{1,2}:\d{2}:\d{2}$|^\d+-\d{1,2}:\d{2}:\d{2}$|^\d+$', args.time):
-                errors.append('Invalid walltime format. Use HH:MM:SS, D-HH:MM:SS, or minutes')
-        
-        if args.nodes and args.nodes < 1:
-            errors.append('Number of nodes must be at least 1')
+        for error in self.schema.validate(vars(args)):
+            message = f'--{error["field"].replace("_", "-")}: {error["message"]}'
+            if error['severity'] == 'error':
+                errors.append(message)
+            else:
+                print(f"Warning: {message}", file=sys.stderr)
         
         return errors
 
@@ -224,7 +263,7 @@ Examples:
             account = input("Account is required. Please enter: ").strip()
         
         walltime = input("Walltime (HH:MM:SS or minutes, required): ").strip()
-        while not walltime or not re.match(r'^\d{1,2}:\d{2}:\d{2}$|^\d+-\d{1,2}:\d{2}:\d{2}$|^\d+$', walltime):
+        while not walltime or not WALLTIME_RE.match(walltime):
             walltime = input("Invalid format. Enter walltime (HH:MM:SS or minutes): ").strip()
         
         # Optional parameters
@@ -307,6 +346,7 @@ Examples:
         args.job_name = job_name
         args.partition = partition if partition else None
         args.qos = None
+        args.array = None
         args.nodes = nodes
         args.ntasks = ntasks
         args.ntasks_per_node = ntasks_per_node
@@ -344,6 +384,8 @@ Examples:
         lines.append(f'# Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
         lines.append(f'# Job: {args.job_name or "my_job"}')
         lines.append(f'# Application: {template_config["description"]}')
+        if self.registry.cluster:
+            lines.append(f'# Cluster: {self.registry.cluster_name}')
         lines.append('')
         
         # Required SBATCH directives
@@ -354,12 +396,19 @@ Examples:
         if args.job_name:
             lines.append(f'#SBATCH --job-name={args.job_name}')
         
+        # Lets later right-sizing find this job's history by template
+        if getattr(args, 'right_size', False):
+            lines.append(f'#SBATCH --comment=template={app_template}')
+        
         if args.partition:
             lines.append(f'#SBATCH --partition={args.partition}')
         
         if args.qos and args.qos != 'normal':
             lines.append(f'#SBATCH --qos={args.qos}')
         
+        if args.array:
+            lines.append(f'#SBATCH --array={args.array}')
+        
         # Resource requests
         lines.append(f'#SBATCH --nodes={args.nodes}')
         
@@ -373,15 +422,16 @@ Examples:
             lines.append(f'#SBATCH --cpus-per-task={args.cpus_per_task}')
         
         if args.memory:
-            lines.append(f'#SBATCH --mem={args.memory}')
+            lines.append(f'#SBATCH --mem={slurm_size(args.memory)}')
         elif args.memory_per_cpu:
-            lines.append(f'#SBATCH --mem-per-cpu={args.memory_per_cpu}')
+            lines.append(f'#SBATCH --mem-per-cpu={slurm_size(args.memory_per_cpu)}')
         
-        if args.gpus:
-            lines.append(f'#SBATCH --gpus={args.gpus}')
+        gpu_plan = self.schema.gpu_plan(vars(args))
+        if gpu_plan:
+            lines.extend(gpu_plan.directives)
         
         if args.tmp:
-            lines.append(f'#SBATCH --tmp={args.tmp}')
+            lines.append(f'#SBATCH --tmp={slurm_size(args.tmp)}')
         
         # Email notifications
         if args.mail_user:
@@ -394,6 +444,12 @@ Examples:
         if args.error and args.error != args.output:
             lines.append(f'#SBATCH --error={args.error}')
         
+        # Checkpoint/requeue mode
+        resilient = getattr(args, 'resilient', False)
+        if resilient:
+            lead_time = self.schema.checkpoint_lead_time(vars(args))
+            lines.extend(resilience_directives(lead_time))
+        
         lines.append('')
         
         # Job information
@@ -409,7 +465,7 @@ Examples:
         ])
         
         # Module loading (combine template modules with user modules)
-        all_modules = template_config.get('modules', [])
+        all_modules = list(template_config.get('modules', []))
         if args.modules:
             all_modules.extend([m for m in args.modules if m])
         
@@ -420,25 +476,50 @@ Examples:
             lines.append('module list')
             lines.append('')
         
-        # Environment setup (from template)
-        if template_config.get('environment'):
+        # Environment setup (combine template environment with user setup)
+        all_env = list(template_config.get('environment', []))
+        if getattr(args, 'environment', None):
+            all_env.extend([line for line in args.environment if line])
+        
+        if all_env:
             lines.append('# Environment setup')
-            for env_line in template_config['environment']:
+            for env_line in all_env:
                 lines.append(env_line)
             lines.append('')
         
+        # GPU setup (MPS for tasks sharing a GPU)
+        if gpu_plan and gpu_plan.environment:
+            lines.append('# GPU setup')
+            lines.extend(gpu_plan.environment)
+            lines.append('')
+        
+        # Stage inputs onto node-local storage and results back on exit
+        if getattr(args, 'stage_in', None) or getattr(args, 'stage_out', None):
+            lines.extend(staging_lines(args.stage_in, args.stage_out, args.nodes,
+                                       gpu_plan.on_exit if gpu_plan else ()))
+            lines.append('')
+        
+        # Step timing and resource sampling
+        telemetry = getattr(args, 'telemetry', False)
+        if telemetry:
+            lines.extend(telemetry_setup(args.output, getattr(args, 'telemetry_interval', None), bool(gpu_plan)))
+            lines.append('')
+        
         # Job commands
         lines.append('# Job execution')
+        execution_start = len(lines)
         
         # Generate srun command if applicable
         srun_cmd = self._generate_srun_command(args, template_config)
+        if srun_cmd and gpu_plan:
+            srun_cmd = ' '.join([srun_cmd] + gpu_plan.srun_flags + ([gpu_plan.launcher] if gpu_plan.launcher else []))
         
         if args.commands:
             if srun_cmd:
                 lines.append('# MPI/Parallel execution with srun')
             for command in args.commands:
                 if command:
-                    if srun_cmd and self._is_mpi_command(command, app_template):
+                    if srun_cmd and self._needs_srun(command, app_template):
                         lines.append(f'{srun_cmd} {command}')
                     else:
                         lines.append(command)
@@ -449,7 +530,7 @@ Examples:
                 with open(args.script_file, 'r') as f:
                     for line in f:
                         line = line.rstrip()
-                        if line and srun_cmd and self._is_mpi_command(line, app_template):
+                        if line and srun_cmd and self._needs_srun(line, app_template):
                             lines.append(f'{srun_cmd} {line}')
                         else:
                             lines.append(line)
@@ -459,7 +540,7 @@ Examples:
         else:
             # Use template default command if no user commands provided
             default_cmd = template_config.get('default_command', 'echo "Add your commands here"')
-            if srun_cmd and self._is_mpi_command(default_cmd, app_template):
+            if srun_cmd and self._needs_srun(default_cmd, app_template):
                 lines.append(f'{srun_cmd} {default_cmd}')
             else:
                 lines.append(default_cmd)
@@ -472,9 +553,21 @@ Examples:
                     '# For serial programs within the allocation: your_program'
                 ])
         
+        epilogue = []
+        if telemetry:
+            lines[execution_start:], labels = instrument_steps(lines[execution_start:])
+            epilogue = telemetry_summary(labels)
+        
         lines.append('')
         lines.append('echo "Job completed at: $(date)"')
         
+        if resilient:
+            lines[execution_start:] = resilient_execution(
+                lines[execution_start:], template_config, lead_time,
+                lambda line: self._is_mpi_command(line, app_template), epilogue)
+        elif epilogue:
+            lines[-1:-1] = epilogue + ['']
+        
         return '\n'.join(lines)
     
     def _generate_srun_command(self, args, template_config=None):
@@ -508,28 +601,324 @@ Examples:
         
         return None
     
+    def _right_size(self, spec):
+        """Suggest, or with --right-size apply, walltime and memory from the job history"""
+        if not spec.get('history'):
+            return
+        try:
+            history = get_history(spec['history'])
+        except OSError as e:
+            print(f"Warning: --history: {e}", file=sys.stderr)
+            return
+        template = spec.get('template') or 'general'
+        suggestion = history.suggest(spec.get('job_name'), template, spec.get('percentile') or DEFAULT_PERCENTILE)
+        if not suggestion or not (suggestion['time'] or suggestion['memory']):
+            return
+        basis = f"{suggestion['samples']} completed jobs ({suggestion['basis'].replace(':', ' ')})"
+        if spec.get('right_size'):
+            for key, old, new in right_size(spec, suggestion):
+                print(f"Right-sized --{key.replace('_', '-')} {old} -> {new} from {basis}", file=sys.stderr)
+            return
+        values = [f'--{key} {suggestion[key]}' for key in ('time', 'memory') if suggestion[key]]
+        print(f"Suggested from p{suggestion['percentile']} of {basis}: {' '.join(values)}", file=sys.stderr)
+    
+    def _size_staging(self, spec):
+        """Size --tmp for the --stage-in inputs found from the current directory"""
+        if not spec.get('stage_in'):
+            return
+        spec['tmp'], missing = staging_tmp_size(spec['stage_in'], spec.get('tmp'))
+        for pattern in missing:
+            print(f"Warning: --stage-in: {pattern} not found here; --tmp is not sized for it", file=sys.stderr)
+    
     def _is_mpi_command(self, command, app_template='general'):
         """Check if a command appears to be an MPI/parallel program"""
-        # Application-specific MPI command detection
-        app_mpi_indicators = {
-            'general': ['python', 'mpirun', 'mpiexec', './', 'vasp', 'openfoam'],
-            'gaussian': ['g16', 'g09'],  # Gaussian handles parallelization internally
-            'lammps': ['lmp'],
-            'ansys': ['fluent', 'ansys'],
-            'comsol': ['comsol']
+        template_config = self.application_templates.get(app_template, self.application_templates['general'])
+        return is_mpi_command(template_config, command)
+    
+    def _needs_srun(self, command, app_template='general'):
+        """Check if a command should be wrapped in srun (not already launched)"""
+        template_config = self.application_templates.get(app_template, self.application_templates['general'])
+        return needs_srun(template_config, command)
+
+    def _prepare_spec(self, spec, context):
+        """Merge a batch spec over the command-line defaults and size it
+        
+        Returns (CLI for the spec's cluster, merged spec).
+        """
+        merged = dict(context['base'])
+        merged.update(spec)
+        coerce_spec(merged, context['int_options'])
+        cli = self.for_cluster(merged.get('cluster'))
+        cli._right_size(merged)
+        cli._size_staging(merged)
+        if merged.get('auto_partition'):
+            cli.schema.auto_partition(merged)
+        return cli, merged
+    
+    def render_spec(self, index, spec, context):
+        """Validate, hash and render one batch spec; runs in the worker processes
+        
+        With --incremental, a spec whose input hash has a cached fingerprint
+        and content hash is not rendered (``script`` is None).
+        """
+        cli, merged = self._prepare_spec(spec, context)
+        result = {'index': index, 'spec': spec, 'job_name': merged.get('job_name'),
+                  'errors': cli.schema.validate(merged), 'script': None, 'findings': None}
+        if context['validate_only'] or has_errors(result['errors']):
+            return result
+        
+        template = merged.get('template') or 'general'
+        template_version = cli.registry.template_versions.get(template)
+        spec_hash = input_hash(merged, template_version, context['generator_version'])
+        result.update(template=template, template_version=template_version, input_hash=spec_hash)
+        cached = context['cached'].get(spec_hash)
+        if cached:
+            result['fingerprint'], result['content_hash'] = cached
+        else:
+            script = cli.generate_script(argparse.Namespace(**merged))
+            result.update(script=script, fingerprint=fingerprint(script), content_hash=content_hash(script))
+            if context['lint']:
+                result['findings'] = lint_script(script, cli.application_templates, cli.registry.cluster_name)
+        return result
+    
+    def run_batch(self, args, parser):
+        """Validate every batch/sweep spec and generate scripts for the valid ones
+        
+        Scripts are fingerprinted; a spec whose script duplicates an earlier one
+        is recorded in the manifest but not written again. With --incremental,
+        specs whose inputs (spec, template version, generator code) match the
+        previous manifest are neither rendered nor rewritten. Large batches are
+        rendered by a pool of --workers processes in chunks of --chunk-size;
+        results are taken in spec order, so the output does not depend on it.
+        """
+        base = dict(vars(args))
+        for key in ('batch', 'sweep', 'save', 'submit', 'interactive', 'list_templates'):
+            base.pop(key, None)
+        int_options = {action.dest: int for action in parser._actions if action.type is int}
+        
+        specs = iter_specs(args.batch) if args.batch else [{}]
+        specs = expand_sweep(specs, parse_sweep(args.sweep), args.job_name)
+        
+        total = invalid = written = duplicates = unchanged = lint_errors = 0
+        seen = {}
+        files = {}
+        start = time.perf_counter()
+        
+        manifest = writer = None
+        if not args.validate_only:
+            os.makedirs(args.output_dir, exist_ok=True)
+            manifest = Manifest(args.output_dir).open()
+            writer = ScriptWriter()
+        
+        context = {
+            'base': base,
+            'int_options': int_options,
+            'generator_version': file_version(*SCRIPT_MODULES),
+            'validate_only': args.validate_only,
+            'lint': args.lint is not None,
+            'cached': manifest.cached_hashes() if args.incremental else {},
         }
+        head, specs = peek(specs, PARALLEL_THRESHOLD)
+        workers = args.workers or os.cpu_count() or 1
+        if len(head) < PARALLEL_THRESHOLD:
+            workers = 1
+        if workers > 1:
+            results = ordered_map(_render_spec, enumerate(specs), workers, args.chunk_size,
+                                  _init_render_worker, (args.registry, context))
+        else:
+            _init_renderer(self, context)
+            results = map(_render_spec, enumerate(specs))
+        
+        next_report = start + PROGRESS_INTERVAL
+        try:
+            for result in results:
+                total += 1
+                index, spec, errors = result['index'], result['spec'], result['errors']
+                if total % 1000 == 0 and time.perf_counter() > next_report:
+                    next_report = time.perf_counter() + PROGRESS_INTERVAL
+                    print(f"{total:,} specs ({total / (time.perf_counter() - start):,.0f} specs/s)", file=sys.stderr)
+                
+                if args.validate_only:
+                    if errors:
+                        invalid += has_errors(errors)
+                        print(json.dumps({'index': index, 'job_name': result['job_name'], 'errors': errors}))
+                    continue
+                
+                if has_errors(errors):
+                    invalid += 1
+                    print(f"Spec {index} ({result['job_name'] or 'unnamed'}):", file=sys.stderr)
+                    for error in errors:
+                        print(f"  - --{error['field'].replace('_', '-')}: {error['message']}", file=sys.stderr)
+                    continue
+                
+                # With unchanged inputs the previous run's hashes are reused
+                # and the script is not rendered at all
+                digest = result['fingerprint']
+                entry = {'index': index, 'spec': spec, 'input_hash': result['input_hash'],
+                         'template': result['template'], 'template_version': result['template_version'],
+                         'fingerprint': digest, 'content_hash': result['content_hash']}
+                
+                if digest in seen and not args.keep_duplicates:
+                    duplicates += 1
+                    manifest.record(file=seen[digest], duplicate=True, **entry)
+                    self._report_warnings(errors, f"{seen[digest]} (spec {index})")
+                    continue
+                
+                filename = f"{result['job_name'] or f'job_{index}'}.sh"
+                if files.get(filename, digest) != digest:
+                    filename = f"{filename[:-3]}_{index}.sh"
+                files[filename] = digest
+                seen.setdefault(digest, filename)
+                manifest.record(file=filename, duplicate=False, **entry)
+                self._report_warnings(errors, filename)
+                
+                if args.incremental and manifest.unchanged(filename, result['content_hash']):
+                    unchanged += 1
+                    continue
+                
+                script, findings = result['script'], result['findings']
+                if script is None:
+                    cli, merged = self._prepare_spec(spec, context)
+                    script = cli.generate_script(argparse.Namespace(**merged))
+                if args.lint is not None:
+                    lint_errors += self._report_lint(script, filename, findings)
+                writer.write(os.path.join(args.output_dir, filename), script)
+                written += 1
+        finally:
+            if writer:
+                writer.close()
+            if manifest:
+                manifest.close()
+        
+        elapsed = time.perf_counter() - start
+        rate = total / elapsed if elapsed > 0 else 0.0
+        throughput = f"{rate:,.0f} specs/s"
+        if writer and writer.bytes_written:
+            throughput += f", {writer.bytes_written / elapsed / 2 ** 20:,.1f} MiB/s written"
+        if workers > 1:
+            throughput += f", {workers} workers"
+        print(f"{total} specs, {invalid} invalid, {written} scripts written, {duplicates} duplicates, "
+              f"{unchanged} unchanged in {elapsed:.2f}s ({throughput})", file=sys.stderr)
+        return 1 if invalid or lint_errors else 0
+    
+    def run_import(self, args):
+        """Parse existing scripts into job specs, one JSON line per script"""
+        start = time.perf_counter()
+        lines = []
+        templates = {}
+        failed = 0
+        for path, spec, notes in import_scripts(args.import_paths, self.application_templates, args.workers):
+            for note in notes:
+                print(f"{path}: {note}", file=sys.stderr)
+            if spec is None:
+                failed += 1
+                continue
+            lines.append(json.dumps(spec))
+            template = spec.get('template', 'general')
+            templates[template] = templates.get(template, 0) + 1
+        
+        if args.save:
+            atomic_write(args.save, ''.join(line + '\n' for line in lines), mode=0o644)
+        else:
+            for line in lines:
+                print(line)
+        
+        elapsed = time.perf_counter() - start
+        summary = ', '.join(f'{name} {count}' for name, count in sorted(templates.items()))
+        print(f"{len(lines)} scripts imported ({summary or 'none'}), {failed} failed in {elapsed:.2f}s",
+              file=sys.stderr)
+        return 1 if failed or not lines else 0
+    
+    def _report_warnings(self, errors, source):
+        """Print a batch spec's validation warnings to stderr, prefixed with its script's name"""
+        for error in errors:
+            print(f"{source}: Warning: --{error['field'].replace('_', '-')}: {error['message']}", file=sys.stderr)
+    
+    def _report_lint(self, script, source, findings=None):
+        """Print lint findings for a script to stderr; returns the number of errors"""
+        if findings is None:
+            findings = lint_script(script, self.application_templates, self.registry.cluster_name)
+        for line in format_findings(findings, source):
+            print(line, file=sys.stderr)
+        return sum(1 for finding in findings if finding['severity'] == 'error')
+    
+    def run_lint(self, paths):
+        """Lint existing scripts; directories are searched for .sh files"""
+        scripts = []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    scripts.extend(os.path.join(root, name) for name in sorted(names) if name.endswith('.sh'))
+            else:
+                scripts.append(path)
+        
+        errors = 0
+        for path in scripts:
+            try:
+                with open(path, 'r', errors='replace') as f:
+                    errors += self._report_lint(f.read(), path)
+            except OSError as e:
+                print(f"{path}: {e.strerror}", file=sys.stderr)
+                errors += 1
+        print(f"{len(scripts)} scripts checked, {errors} errors", file=sys.stderr)
+        return 1 if errors else 0
+
+    def run_workflow(self, args, parser):
+        """Compile a workflow file into stage scripts plus a submit_<name>.sh driver"""
+        base = dict(vars(args))
+        for key in ('workflow', 'no_hetjob', 'batch', 'sweep', 'save', 'submit', 'interactive', 'list_templates'):
+            base.pop(key, None)
+        int_options = {action.dest: int for action in parser._actions if action.type is int}
+        
+        def validate(spec):
+            coerce_spec(spec, int_options)
+            self._right_size(spec)
+            self._size_staging(spec)
+            if spec.get('auto_partition'):
+                self.schema.auto_partition(spec)
+            return self.schema.validate(spec)
+        
+        def render(spec):
+            return self.generate_script(argparse.Namespace(**spec))
+        
+        def parallel(spec):
+            # Every command must be wrapped in srun to run inside its own het component
+            args = argparse.Namespace(**spec)
+            template = spec.get('template') or 'general'
+            template_config = self.application_templates.get(template, self.application_templates['general'])
+            commands = spec.get('commands') or ([] if spec.get('script_file') else [template_config.get('default_command', '')])
+            return (bool(commands) and self._generate_srun_command(args, template_config) is not None
+                    and all(self._is_mpi_command(command, template) for command in commands))
         
-        indicators = app_mpi_indicators.get(app_template, app_mpi_indicators['general'])
-        cmd_lower = command.lower()
+        try:
+            document = parse_document(args.workflow)
+            name, files = compile_workflow(document, base, render, validate, parallel,
+                                           hetjobs=not args.no_hetjob)
+        except WorkflowError as e:
+            print(f"Workflow errors in {args.workflow}:")
+            for error in e.errors:
+                print(f"  - {error}")
+            return 1
         
-        # Special case: Gaussian uses g16_nrel which doesn't need srun
-        if app_template == 'gaussian' and 'g16_nrel' in cmd_lower:
-            return False
-            
-        return any(indicator in cmd_lower for indicator in indicators)
+        os.makedirs(args.output_dir, exist_ok=True)
+        for filename, script in files.items():
+            atomic_write(os.path.join(args.output_dir, filename), script)
+            print(f"Wrote {os.path.join(args.output_dir, filename)}")
+        print(f"Submit the workflow with: {os.path.join(args.output_dir, f'submit_{name}.sh')}")
+        return 0
 
     def run(self):
         """Main CLI entry point"""
+        # The registry and cluster decide the valid --template/--partition
+        # choices, so they have to be loaded before the full parser is built
+        pre_parser = argparse.ArgumentParser(add_help=False)
+        pre_parser.add_argument('--registry', type=str)
+        pre_parser.add_argument('--cluster', type=str)
+        pre_args, _ = pre_parser.parse_known_args()
+        if pre_args.registry:
+            self.registry = get_registry(pre_args.registry)
+        self.registry = self.for_cluster(pre_args.cluster).registry
+        
         parser = self.create_parser()
         
         # If no arguments provided, show help
@@ -552,10 +941,41 @@ Examples:
                 print()
             return 0
         
+        # Import existing scripts
+        if args.import_paths:
+            return self.run_import(args)
+        
+        # Lint existing scripts
+        if args.lint:
+            return self.run_lint(args.lint)
+        
+        # Workflow mode
+        if args.workflow:
+            try:
+                return self.run_workflow(args, parser)
+            except ValueError as e:
+                parser.error(str(e))
+        
+        # Batch/sweep mode
+        if args.batch or args.sweep:
+            try:
+                return self.run_batch(args, parser)
+            except ValueError as e:
+                parser.error(str(e))
+        
         # Interactive mode
         if args.interactive:
             args = self.interactive_mode()
         
+        self._right_size(vars(args))
+        self._size_staging(vars(args))
+        
+        if getattr(args, 'auto_partition', False):
+            requested = args.partition
+            chosen = self.schema.auto_partition(vars(args))
+            if chosen and chosen != requested:
+                print(f"Using partition {chosen} (smallest partition that fits this job)", file=sys.stderr)
+        
         # Validate arguments
         errors = self.validate_args(args)
         if errors:
@@ -566,18 +986,26 @@ Examples:
         
         # Generate script
         script = self.generate_script(args)
+        lint_errors = self._report_lint(script, args.save or '<script>') if getattr(args, 'lint', None) is not None else 0
         
         # Output handling
         if args.save:
-            with open(args.save, 'w') as f:
-                f.write(script)
-            print(f"Job script saved to: {args.save}")
+            unchanged = False
+            if getattr(args, 'incremental', False) and os.path.exists(args.save):
+                with open(args.save, 'r') as f:
+                    unchanged = same_content(f.read(), script)
             
-            # Make executable
-            os.chmod(args.save, 0o755)
+            if unchanged:
+                print(f"Job script unchanged: {args.save}")
+            else:
+                # Written via temp file + rename and made executable
+                atomic_write(args.save, script)
+                print(f"Job script saved to: {args.save}")
             
             # Submit if requested
-            if args.submit:
+            if args.submit and lint_errors:
+                print("Not submitting: fix the lint errors above first")
+            elif args.submit:
                 import subprocess
                 try:
                     result = subprocess.run(['sbatch', args.save], 
@@ -592,7 +1020,29 @@ Examples:
             # Print to stdout
             print(script)
         
-        return 0
+        return 1 if lint_errors else 0
+
+# Batch rendering state of this process: (JobScriptCLI, batch context)
+_renderer = None
+
+
+def _init_renderer(cli, context):
+    global _renderer
+    _renderer = (cli, context)
+
+
+def _init_render_worker(registry_dir, context):
+    """Process pool initializer: each worker loads the registry once"""
+    cli = JobScriptCLI()
+    if registry_dir:
+        cli.registry = get_registry(registry_dir)
+    _init_renderer(cli, context)
+
+
+def _render_spec(item):
+    cli, context = _renderer
+    return cli.render_spec(item[0], item[1], context)
+
 
 def main():
     """Entry point for the CLI"""
@@ -30,19 +30,26 @@ fi
 # Create local bin directory if it doesn't exist
 mkdir -p ~/bin
 
-# Copy the script to user's bin directory
+# Copy the CLI, its helper modules and the template registry
+INSTALL_DIR="$HOME/.local/share/nrel-jobgen"
 if [ -f "generate_job.py" ]; then
-    cp generate_job.py ~/bin/
-    chmod +x ~/bin/generate_job.py
-    
+    mkdir -p "$INSTALL_DIR"
+    for module in *.py; do
+        [ "$module" = "app.py" ] && continue
+        cp "$module" "$INSTALL_DIR/"
+    done
+    rm -rf "$INSTALL_DIR/registry"
+    cp -r registry "$INSTALL_DIR/"
+    chmod +x "$INSTALL_DIR/generate_job.py"
+
     # Create a convenient alias
-    cat > ~/bin/nrel-jobgen << 'EOF'
+    cat > ~/bin/nrel-jobgen << EOF
 #!/bin/bash
-python3 ~/bin/generate_job.py "$@"
+python3 "$INSTALL_DIR/generate_job.py" "\$@"
 EOF
     chmod +x ~/bin/nrel-jobgen
-    
-    echo -e "${GREEN}✓ Installed to ~/bin/generate_job.py${NC}"
+
+    echo -e "${GREEN}✓ Installed to $INSTALL_DIR${NC}"
     echo -e "${GREEN}✓ Created alias: ~/bin/nrel-jobgen${NC}"
 else
     echo -e "${RED}Error: generate_job.py not found in current directory${NC}"
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Campaigns
+Load job specs for batch mode, expand parameter sweeps and keep the manifest
+that maps each spec to its script fingerprint and output file.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+# Spec keys that control the run rather than the script contents
+RUN_OPTIONS = frozenset([
+    'batch', 'sweep', 'output_dir', 'validate_only', 'keep_duplicates', 'incremental',
+    'registry', 'save', 'submit', 'interactive', 'list_templates', 'auto_partition',
+    'workflow', 'no_hetjob', 'history', 'percentile', 'lint',
+    'import_paths', 'workers', 'chunk_size',
+])
+
+
+def iter_specs(path):
+    """Yield job specs from a JSON Lines file or a file holding a JSON list
+
+    Keys may be written as option names ("job-name") or attribute names ("job_name").
+    """
+    with open(path, 'r') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first == '[':
+            f.seek(0)
+            specs = json.load(f)
+        else:
+            f.seek(0)
+            specs = (json.loads(line) for line in f if line.strip())
+        for spec in specs:
+            yield {key.replace('-', '_'): value for key, value in spec.items()}
+
+
+def parse_sweep(axes):
+    """Turn ["nodes=1,2,4", "partition=short,standard"] into [(key, [values]), ...]"""
+    parsed = []
+    for axis in axes or []:
+        if '=' not in axis:
+            raise ValueError(f'Invalid sweep axis "{axis}". Use KEY=VALUE1,VALUE2,...')
+        key, values = axis.split('=', 1)
+        values = [v.strip() for v in values.split(',') if v.strip()]
+        if not values:
+            raise ValueError(f'Sweep axis "{key}" has no values')
+        parsed.append((key.strip().replace('-', '_'), values))
+    return parsed
+
+
+def expand_sweep(specs, axes, default_name='job'):
+    """Yield every spec combined with every point of the sweep grid
+
+    Each point gets a job name derived from its base name and axis values,
+    e.g. ``md_nodes2_ntasks64``.
+    """
+    if not axes:
+        yield from specs
+        return
+    keys = [key for key, _ in axes]
+    grid = list(itertools.product(*(values for _, values in axes)))
+    for spec in specs:
+        base_name = spec.get('job_name') or default_name or 'job'
+        for point in grid:
+            expanded = dict(spec)
+            expanded.update(zip(keys, point))
+            suffix = '_'.join(f'{key}{value}' for key, value in zip(keys, point))
+            expanded['job_name'] = f'{base_name}_{suffix}'.replace('/', '-')
+            yield expanded
+
+
+def coerce_spec(spec, types):
+    """Convert string values to the option types the generator expects (e.g. nodes -> int)"""
+    for key, convert in types.items():
+        value = spec.get(key)
+        if isinstance(value, str) and value.strip():
+            try:
+                spec[key] = convert(value)
+            except (TypeError, ValueError):
+                pass  # left as-is so validation reports it
+    return spec
+
+
+def input_hash(spec, template_version, generator_version):
+    """Hash of everything that determines a script: spec, template and generator code"""
+    digest = hashlib.sha256()
+    inputs = {key: value for key, value in spec.items() if key not in RUN_OPTIONS and value is not None}
+    digest.update(json.dumps(inputs, sort_keys=True, default=str).encode())
+    digest.update(f'{template_version}:{generator_version}'.encode())
+    script_file = spec.get('script_file')
+    if script_file and os.path.exists(script_file):
+        with open(script_file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def file_version(*paths):
+    """Short content hash of one or more source files, used to version generator code"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def atomic_write(path, text, mode=0o755):
+    """Write a file via a temporary file and rename, so readers never see a partial script"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class Manifest:
+    """JSON Lines manifest: one entry per spec with its input hash, fingerprint, content hash and output file"""
+
+    def __init__(self, output_dir, name=MANIFEST_NAME):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, name)
+        self.by_input = {}
+        self.previous = self._load_previous()
+        self._file = None
+
+    def _load_previous(self):
+        """Map file -> entry (and input hash -> entry) from the manifest of an earlier run"""
+        previous = {}
+        if not os.path.exists(self.path):
+            return previous
+        with open(self.path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('file'):
+                    previous[entry['file']] = entry
+                if entry.get('input_hash'):
+                    self.by_input[entry['input_hash']] = entry
+        return previous
+
+    def cached_hashes(self):
+        """Map input hash -> (fingerprint, content hash) for every previous script that still exists"""
+        return {input_hash: (entry['fingerprint'], entry['content_hash'])
+                for input_hash, entry in self.by_input.items()
+                if entry.get('content_hash') and os.path.exists(os.path.join(self.output_dir, entry['file']))}
+
+    def unchanged(self, filename, content_hash):
+        """True if an earlier run wrote the same script text to this file and it is still there
+
+        Compares content hashes, not fingerprints: a script that only differs
+        in its job name or comments has the same fingerprint but must be rewritten.
+        """
+        entry = self.previous.get(filename)
+        return (entry is not None and entry.get('content_hash') == content_hash
+                and os.path.exists(os.path.join(self.output_dir, filename)))
+
+    def open(self):
+        tmp_path = self.path + '.tmp'
+        self._file = open(tmp_path, 'w')
+        return self
+
+    def record(self, **entry):
+        self._file.write(json.dumps(entry, sort_keys=True) + '\n')
+
+    def close(self):
+        """Replace the previous manifest with the one just written"""
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self.path + '.tmp', self.path)
+        self._file = None
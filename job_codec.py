@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Compact Spec Encodings
+Decode job specs sent to the web API as JSON, msgpack or a versioned binary
+format, negotiated by Content-Type. Batches can be sent in a columnar form
+where every field is one array (and fields shared by all specs a single
+value), which is smaller and cheaper to decode than a list of objects.
+
+Columnar form (JSON or msgpack):
+
+    {"shared": {"account": "csc000", "walltime": "04:00:00"},
+     "columns": {"job_name": ["run1", "run2"], "nodes": [1, 2]}}
+
+Binary format, version 1 (big-endian):
+
+    header   "NJS" | version u8 | code digest 4 bytes | specs u32 | fields u16
+    field    name length u8 | name | kind u8 | flags u8 (1 = one shared value)
+    values   one per spec (or one if shared), by kind:
+             str  u32 length + UTF-8, 0xFFFFFFFF = missing
+             int  i64, -2**63 = missing
+             bool u8 0/1, 2 = missing
+             enum u16 index into the code table, 0xFFFF = missing
+
+Partition, QoS and template are enum-coded with the code tables from
+``GET /spec-codes``; the digest in the header must match them.
+"""
+
+import hashlib
+import json
+import struct
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional
+    msgpack = None
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+BINARY_TYPE = 'application/vnd.nrel.jobspec'
+
+BINARY_MAGIC = b'NJS'
+BINARY_VERSION = 1
+
+# Fields sent as indexes into the code tables in the binary format
+ENUM_FIELDS = ('partition', 'qos', 'application_template')
+
+KIND_STR, KIND_INT, KIND_BOOL, KIND_ENUM = range(4)
+FLAG_SHARED = 1
+
+_HEADER = struct.Struct('>3sB4sIH')
+_U8 = struct.Struct('>B')
+_U16 = struct.Struct('>H')
+_U32 = struct.Struct('>I')
+_I64 = struct.Struct('>q')
+
+# Largest batch decoded in one request
+MAX_SPECS = 100000
+
+MISSING_STR = 0xFFFFFFFF
+MISSING_INT = -2 ** 63
+MISSING_BOOL = 2
+MISSING_ENUM = 0xFFFF
+
+
+class SpecFormatError(ValueError):
+    """Raised when a request body cannot be decoded into job specs"""
+
+
+def is_supported(mimetype):
+    """True if specs in this Content-Type can be decoded here"""
+    if mimetype == JSON_TYPE or mimetype.endswith('+json') or mimetype == BINARY_TYPE:
+        return True
+    return mimetype in MSGPACK_TYPES and msgpack is not None
+
+
+def spec_codes(partitions, qos_options, templates):
+    """Code tables for the enum-coded fields, with a digest that changes with them"""
+    codes = {
+        'partition': list(partitions),
+        'qos': list(qos_options),
+        'application_template': list(templates),
+    }
+    digest = hashlib.sha256(json.dumps(codes, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+    return {'version': BINARY_VERSION, 'digest': digest, **codes}
+
+
+def columns_to_specs(document):
+    """Expand the columnar form into a list of specs; null entries leave the field out"""
+    shared = document.get('shared') or {}
+    columns = document.get('columns') or {}
+    if not isinstance(shared, dict) or not isinstance(columns, dict):
+        raise SpecFormatError('"shared" and "columns" must be objects')
+    if not all(isinstance(values, list) for values in columns.values()):
+        raise SpecFormatError('Every column must be a list')
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise SpecFormatError('Every column must have the same length')
+    count = lengths.pop() if lengths else document.get('count', 1)
+    if isinstance(count, str) and count.strip().isdigit():
+        count = int(count)
+    if isinstance(count, bool) or not isinstance(count, int) or count < 0:
+        raise SpecFormatError('"count" must be a non-negative integer')
+    if count > MAX_SPECS:
+        raise SpecFormatError(f'At most {MAX_SPECS} specs can be sent at once')
+
+    specs = [dict(shared) for _ in range(count)]
+    for field, values in columns.items():
+        for spec, value in zip(specs, values):
+            if value is not None:
+                spec[field] = value
+    return specs
+
+
+def specs_to_columns(specs):
+    """Columnar form of a list of specs, the inverse of columns_to_specs"""
+    fields = []
+    for spec in specs:
+        fields.extend(field for field in spec if field not in fields)
+    shared, columns = {}, {}
+    for field in fields:
+        values = [spec.get(field) for spec in specs]
+        if len(specs) > 1 and all(field in spec and value == values[0] for spec, value in zip(specs, values)):
+            shared[field] = values[0]
+        else:
+            columns[field] = values
+    return {'shared': shared, 'columns': columns, 'count': len(specs)}
+
+
+def _kind(field, values):
+    if field in ENUM_FIELDS:
+        return KIND_ENUM
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, bool) for value in present):
+        return KIND_BOOL
+    if present and all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        return KIND_INT
+    return KIND_STR
+
+
+def encode_binary(specs, codes):
+    """Encode a list of specs in the binary format"""
+    document = specs_to_columns(specs)
+    fields = [(field, [value], FLAG_SHARED) for field, value in document['shared'].items()]
+    fields.extend((field, values, 0) for field, values in document['columns'].items())
+    parts = [_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, bytes.fromhex(codes['digest']), len(specs), len(fields))]
+
+    for field, values, flags in fields:
+        name = field.encode('utf-8')
+        kind = _kind(field, values)
+        parts.extend([_U8.pack(len(name)), name, _U8.pack(kind), _U8.pack(flags)])
+        for value in values:
+            if kind == KIND_ENUM:
+                if value is not None and value not in codes[field]:
+                    raise SpecFormatError(f'Unknown {field} "{value}"')
+                parts.append(_U16.pack(MISSING_ENUM if value is None else codes[field].index(value)))
+            elif kind == KIND_INT:
+                parts.append(_I64.pack(MISSING_INT if value is None else value))
+            elif kind == KIND_BOOL:
+                parts.append(_U8.pack(MISSING_BOOL if value is None else int(value)))
+            elif value is None:
+                parts.append(_U32.pack(MISSING_STR))
+            else:
+                text = str(value).encode('utf-8')
+                parts.extend([_U32.pack(len(text)), text])
+    return b''.join(parts)
+
+
+def decode_binary(body, codes):
+    """Decode the binary format into a list of specs"""
+    try:
+        magic, version, digest, count, num_fields = _HEADER.unpack_from(body, 0)
+    except struct.error:
+        raise SpecFormatError('Binary job spec is too short')
+    if magic != BINARY_MAGIC:
+        raise SpecFormatError('Not a binary job spec')
+    if version != BINARY_VERSION:
+        raise SpecFormatError(f'Unsupported binary job spec version {version}')
+    if count > MAX_SPECS:
+        raise SpecFormatError(f'At most {MAX_SPECS} specs can be sent at once')
+
+    specs = [{} for _ in range(count)]
+    offset = _HEADER.size
+    try:
+        for _ in range(num_fields):
+            (length,) = _U8.unpack_from(body, offset)
+            field = body[offset + 1:offset + 1 + length].decode('utf-8')
+            offset += 1 + length
+            kind, flags = body[offset], body[offset + 1]
+            offset += 2
+            if kind == KIND_ENUM:
+                if field not in ENUM_FIELDS:
+                    raise SpecFormatError(f'Field "{field}" cannot be enum-coded')
+                if digest.hex() != codes['digest']:
+                    raise SpecFormatError('Enum codes are out of date; fetch /spec-codes and encode again')
+                table = codes[field]
+
+            values = []
+            for _ in range(1 if flags & FLAG_SHARED else count):
+                if kind == KIND_STR:
+                    (length,) = _U32.unpack_from(body, offset)
+                    offset += 4
+                    if length == MISSING_STR:
+                        values.append(None)
+                        continue
+                    values.append(body[offset:offset + length].decode('utf-8'))
+                    offset += length
+                elif kind == KIND_INT:
+                    (value,) = _I64.unpack_from(body, offset)
+                    offset += 8
+                    values.append(None if value == MISSING_INT else value)
+                elif kind == KIND_BOOL:
+                    value = body[offset]
+                    offset += 1
+                    values.append(None if value == MISSING_BOOL else bool(value))
+                elif kind == KIND_ENUM:
+                    (value,) = _U16.unpack_from(body, offset)
+                    offset += 2
+                    if value != MISSING_ENUM and value >= len(table):
+                        raise SpecFormatError(f'Unknown {field} code {value}')
+                    values.append(None if value == MISSING_ENUM else table[value])
+                else:
+                    raise SpecFormatError(f'Unknown value kind {kind} for field "{field}"')
+
+            if flags & FLAG_SHARED:
+                if values[0] is not None:
+                    for spec in specs:
+                        spec[field] = values[0]
+            else:
+                for spec, value in zip(specs, values):
+                    if value is not None:
+                        spec[field] = value
+    except (struct.error, IndexError, UnicodeDecodeError):
+        raise SpecFormatError('Binary job spec is truncated or corrupt')
+    if offset != len(body):
+        raise SpecFormatError('Binary job spec has trailing data')
+    return specs
+
+
+def decode_body(body, mimetype, codes):
+    """Decode a request body into a spec or a list of specs by its Content-Type"""
+    if mimetype == BINARY_TYPE:
+        return decode_binary(body, codes)
+    if mimetype in MSGPACK_TYPES:
+        if msgpack is None:
+            raise SpecFormatError('msgpack is not installed on the server')
+        try:
+            document = msgpack.unpackb(body, raw=False)
+        except (ValueError, msgpack.exceptions.UnpackException) as e:
+            raise SpecFormatError(f'Invalid msgpack body: {e}')
+    else:
+        try:
+            document = json.loads(body)
+        except ValueError as e:
+            raise SpecFormatError(f'Invalid JSON body: {e}')
+    if isinstance(document, dict) and 'columns' in document:
+        return columns_to_specs(document)
+    return document
+
+
+def encode_msgpack(payload):
+    """Serialize a response payload with msgpack"""
+    return msgpack.packb(payload, use_bin_type=True)
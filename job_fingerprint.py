@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Script Fingerprints
+Canonical fingerprint of a rendered batch script: normalised #SBATCH directives
+plus the executable body, ignoring comments, timestamps and the job name.
+"""
+
+import hashlib
+import re
+
+from job_schema import parse_walltime
+from job_units import parse_size
+
+SBATCH_RE = re.compile(r'^#SBATCH\s+(--?[A-Za-z][\w-]*)(?:[=\s]\s*(.*?))?\s*$')
+
+# Short sbatch options and their long equivalents
+SHORT_OPTIONS = {
+    '-A': '--account',
+    '-t': '--time',
+    '-J': '--job-name',
+    '-p': '--partition',
+    '-q': '--qos',
+    '-N': '--nodes',
+    '-n': '--ntasks',
+    '-c': '--cpus-per-task',
+    '-G': '--gpus',
+    '-o': '--output',
+    '-e': '--error',
+    '-a': '--array',
+    '-d': '--dependency',
+    '-C': '--constraint',
+    '-D': '--chdir',
+}
+
+# Directives that never change what a job computes
+IGNORED_DIRECTIVES = frozenset(['--job-name'])
+
+SIZE_DIRECTIVES = frozenset(['--mem', '--mem-per-cpu', '--mem-per-gpu', '--tmp'])
+
+# Header line that differs between otherwise identical renders
+TIMESTAMP_PREFIX = '# Generated on: '
+
+
+def split_directive(line):
+    """Split an #SBATCH line into (long_option, value), or None if it is not one"""
+    match = SBATCH_RE.match(line.strip())
+    if not match:
+        return None
+    option, value = match.groups()
+    return SHORT_OPTIONS.get(option, option), (value or '').strip()
+
+
+def normalize_directive(option, value):
+    """Canonical form of a directive value so equivalent spellings compare equal"""
+    try:
+        if option == '--time':
+            minutes = parse_walltime(value)
+            return f'{minutes:g}'
+        if option in SIZE_DIRECTIVES:
+            return str(parse_size(value))
+    except ValueError:
+        pass
+    return value
+
+
+def canonical_form(script, ignore=IGNORED_DIRECTIVES):
+    """Return the normalised text a fingerprint is computed from"""
+    directives = []
+    body = []
+    for raw in script.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        directive = split_directive(line)
+        if directive:
+            option, value = directive
+            if option not in ignore:
+                directives.append(f'{option}={normalize_directive(option, value)}')
+            continue
+        if line.startswith('#'):
+            continue
+        body.append(line)
+    return '\n'.join(sorted(directives)) + '\n--\n' + '\n'.join(body)
+
+
+def _content_lines(script):
+    return [line for line in script.splitlines() if not line.startswith(TIMESTAMP_PREFIX)]
+
+
+def same_content(script, other):
+    """True if two scripts differ at most in their "Generated on" timestamp
+
+    Unlike fingerprints, which deliberately ignore the job name and comments,
+    this decides whether a saved script needs rewriting.
+    """
+    return _content_lines(script) == _content_lines(other)
+
+
+def content_hash(script):
+    """SHA-256 of a script's full text except its timestamp; equal hashes mean same_content"""
+    return hashlib.sha256('\n'.join(_content_lines(script)).encode()).hexdigest()
+
+
+def fingerprint(script, ignore=IGNORED_DIRECTIVES):
+    """SHA-256 fingerprint of a rendered script, stable across regenerations"""
+    return hashlib.sha256(canonical_form(script, ignore).encode()).hexdigest()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - GPU Launch Planner
+Decide how the tasks of a GPU job are bound to GPUs: one or more GPUs per
+task, or several tasks sharing each GPU, optionally through CUDA MPS so small
+processes run concurrently instead of time-slicing a whole H100.
+"""
+
+MPS_PIPE_DIRECTORY = '/tmp/nvidia-mps-$SLURM_JOB_ID'
+MPS_LOG_DIRECTORY = '/tmp/nvidia-mps-log-$SLURM_JOB_ID'
+MPS_LAUNCHER = '$PWD/.mps-launcher-$SLURM_JOB_ID.sh'
+MPS_STOP = 'mps_stop'
+EVERY_NODE = 'srun --overlap --nodes="$SLURM_JOB_NUM_NODES" --ntasks="$SLURM_JOB_NUM_NODES" --ntasks-per-node=1'
+
+# Per-task wrapper: every task waits for its node's MPS control daemon and
+# then runs the application
+MPS_LAUNCHER_SCRIPT = [
+    '#!/bin/bash',
+    'for i in $(seq 30); do',
+    '    [ -e "$CUDA_MPS_PIPE_DIRECTORY/control" ] && break',
+    '    sleep 1',
+    'done',
+    'exec "$@"',
+]
+
+
+class GpuPlan:
+    """How a GPU job requests, binds and shares its GPUs"""
+
+    def __init__(self):
+        self.directives = []
+        self.srun_flags = []
+        self.launcher = None
+        self.environment = []
+        self.on_exit = []       # shell functions the script's EXIT trap must run
+        self.notes = []
+        self.tasks_per_gpu = 1
+
+
+def tasks_per_node(nodes, ntasks=None, ntasks_per_node=None):
+    """Tasks on each node, or None if they are not spread evenly"""
+    if ntasks_per_node:
+        return ntasks_per_node
+    if ntasks and ntasks % nodes == 0:
+        return ntasks // nodes
+    return None
+
+
+def plan_gpu_launch(gpus, nodes=1, ntasks=None, ntasks_per_node=None, mps=False):
+    """Plan GPU directives, srun binding and MPS setup for a job, or None without GPUs
+
+    Multi-node jobs get the same number of GPUs on every node, so the binding
+    is identical on each of them. ``notes`` explains choices the planner could
+    not make (uneven layouts, sharing without MPS).
+    """
+    if not gpus:
+        return None
+    nodes = max(nodes or 1, 1)
+    plan = GpuPlan()
+
+    if nodes > 1 and gpus % nodes == 0:
+        node_gpus = gpus // nodes
+        plan.directives.append(f'#SBATCH --gpus-per-node={node_gpus}')
+    else:
+        node_gpus = gpus if nodes == 1 else None
+        plan.directives.append(f'#SBATCH --gpus={gpus}')
+        if node_gpus is None:
+            plan.notes.append(f'{gpus} GPUs cannot be spread evenly over {nodes} nodes; '
+                              f'tasks are not bound to GPUs')
+
+    local_tasks = tasks_per_node(nodes, ntasks, ntasks_per_node)
+    if not (ntasks or ntasks_per_node) or node_gpus is None:
+        if mps:
+            plan.notes.append('MPS needs several tasks per GPU; set --ntasks or --ntasks-per-node')
+        return plan
+    if local_tasks is None:
+        plan.notes.append(f'{ntasks} tasks cannot be spread evenly over {nodes} nodes; tasks are not bound to GPUs')
+        return plan
+
+    if local_tasks <= node_gpus:
+        # One or more whole GPUs per task
+        if node_gpus % local_tasks:
+            plan.notes.append(f'{node_gpus} GPUs per node do not divide evenly between {local_tasks} tasks; '
+                              f'tasks are not bound to GPUs')
+            return plan
+        plan.srun_flags.append(f'--gpus-per-task={node_gpus // local_tasks}')
+        if mps:
+            plan.notes.append('MPS has no effect when every task has its own GPU')
+        return plan
+
+    # More tasks than GPUs: spread local ranks evenly over the node's GPUs
+    plan.tasks_per_gpu = -(-local_tasks // node_gpus)
+    gpu_map = ','.join(str(rank * node_gpus // local_tasks) for rank in range(local_tasks))
+    plan.srun_flags.append(f'--gpu-bind=map_gpu:{gpu_map}')
+    if not mps:
+        plan.notes.append(f'{plan.tasks_per_gpu} tasks share each GPU by time-slicing; '
+                          f'enable MPS to run them concurrently')
+        return plan
+
+    # One control daemon per node, outside the application's step so it sees
+    # all of the node's GPUs and survives from one srun to the next
+    plan.launcher = '"$MPS_LAUNCHER"'
+    plan.environment.extend([
+        f'# CUDA MPS: {plan.tasks_per_gpu} tasks share each GPU concurrently',
+        f'export CUDA_MPS_PIPE_DIRECTORY={MPS_PIPE_DIRECTORY}',
+        f'export CUDA_MPS_LOG_DIRECTORY={MPS_LOG_DIRECTORY}',
+        f'MPS_LAUNCHER={MPS_LAUNCHER}',
+        f'{MPS_STOP}() {{',
+        f"    {EVERY_NODE} bash -c 'echo quit | nvidia-cuda-mps-control'",
+        '    wait "$MPS_PID"',
+        '    rm -f "$MPS_LAUNCHER"',
+        '}',
+        f'{EVERY_NODE} --gpus-per-node={node_gpus} bash -c \'mkdir -p "$CUDA_MPS_PIPE_DIRECTORY" '
+        f'"$CUDA_MPS_LOG_DIRECTORY" && exec nvidia-cuda-mps-control -f\' &',
+        'MPS_PID=$!',
+        f'trap {MPS_STOP} EXIT',
+        "cat > \"$MPS_LAUNCHER\" << 'EOF'",
+    ])
+    plan.environment.extend(MPS_LAUNCHER_SCRIPT)
+    plan.environment.extend(['EOF', 'chmod +x "$MPS_LAUNCHER"'])
+    plan.on_exit.append(MPS_STOP)
+    return plan
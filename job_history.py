@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Usage History
+Right-size walltime and memory from saved ``sacct`` output. The file is parsed
+as a stream, and the elapsed times and peak memory of completed jobs are kept
+in a sorted index per job name and template next to it, so later lookups
+neither re-read the history nor sort it.
+
+Save the history with, e.g.:
+
+    sacct -P -S 2024-01-01 --format=JobID,JobName,State,Elapsed,MaxRSS,NTasks,NNodes,Comment > history.txt
+"""
+
+import csv
+import json
+import math
+import os
+import re
+
+from job_campaign import atomic_write
+from job_schema import parse_walltime
+from job_units import UNIT_FACTORS, parse_size
+
+INDEX_SUFFIX = '.idx.json'
+INDEX_VERSION = 1
+
+# Fewer completed jobs than this are not a reliable basis for a suggestion
+MIN_SAMPLES = 5
+
+DEFAULT_PERCENTILE = 95
+
+# Headroom added on top of the percentile
+TIME_MARGIN = 0.10
+MEMORY_MARGIN = 0.10
+
+# Suggestions are rounded up to these steps
+TIME_STEP = 5
+MEMORY_STEP = UNIT_FACTORS['G']
+
+# Scripts generated with right-sizing carry their template in --comment,
+# so their history can be found by template as well as by job name
+COMMENT_TEMPLATE_RE = re.compile(r'\btemplate=([\w.-]+)')
+
+_ELAPSED_RE = re.compile(r'^(?:(\d+)-)?(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)$')
+_STEP_SUFFIX_RE = re.compile(r'\.[^.]+$')
+
+
+def parse_elapsed(value):
+    """Convert sacct Elapsed ([D-][HH:]MM:SS) to minutes, or None"""
+    match = _ELAPSED_RE.match(value.strip())
+    if not match:
+        return None
+    days, hours, minutes, seconds = match.groups()
+    return int(days or 0) * 1440 + int(hours or 0) * 60 + int(minutes) + float(seconds) / 60.0
+
+
+def parse_rss(value):
+    """Convert sacct MaxRSS (e.g. 1024K, 2.5G) to bytes; plain numbers are kilobytes"""
+    value = value.strip()
+    if not value:
+        return 0
+    try:
+        return parse_size(value, 'K')
+    except ValueError:
+        return 0
+
+
+def format_walltime(minutes):
+    """Format minutes as HH:MM:SS, or D-HH:MM:SS past one day"""
+    minutes = int(minutes)
+    days, minutes = divmod(minutes, 1440)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f'{days}-{hours:02d}:{minutes:02d}:00'
+    return f'{hours:02d}:{minutes:02d}:00'
+
+
+def iter_sacct(lines):
+    """Yield one record per job from sacct -P ('|') or CSV output, reading line by line
+
+    Steps (123.batch, 123.0) are folded into their job: the job line gives
+    name, state and elapsed time, the steps give the peak memory per node
+    (MaxRSS of the largest task times the tasks per node).
+    """
+    lines = iter(lines)
+    header = next(lines, '')
+    delimiter = '|' if '|' in header else ','
+    columns = [name.strip().lower() for name in next(csv.reader([header], delimiter=delimiter))]
+    required = {'jobid', 'jobname', 'state', 'elapsed'}
+    if not required.issubset(columns):
+        raise ValueError(f'sacct history needs the columns {", ".join(sorted(required))}')
+
+    record = None
+    for row in csv.reader(lines, delimiter=delimiter):
+        if not row or len(row) < len(columns):
+            continue
+        fields = dict(zip(columns, row))
+        job_id = fields['jobid'].strip()
+        base_id = _STEP_SUFFIX_RE.sub('', job_id)
+        if base_id == job_id:
+            if record:
+                yield record
+            comment = COMMENT_TEMPLATE_RE.search(fields.get('comment', ''))
+            record = {
+                'job_id': job_id,
+                'job_name': fields['jobname'].strip(),
+                'template': comment.group(1) if comment else None,
+                'state': fields['state'].split()[0] if fields['state'].strip() else '',
+                'elapsed': parse_elapsed(fields['elapsed']),
+                'memory': 0,
+            }
+            continue
+        if record is None or base_id != record['job_id']:
+            continue
+        rss = parse_rss(fields.get('maxrss', ''))
+        try:
+            per_node = -(-int(fields.get('ntasks') or 1) // max(int(fields.get('nnodes') or 1), 1))
+        except ValueError:
+            per_node = 1
+        record['memory'] = max(record['memory'], rss * per_node)
+    if record:
+        yield record
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    rank = max(-(-len(values) * pct // 100), 1)
+    return values[min(int(rank), len(values)) - 1]
+
+
+class UsageHistory:
+    """Indexed elapsed time and peak memory of past jobs, by job name and template"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.signature = self._source_signature()
+        self.keys = self._load_index()
+
+    def _source_signature(self):
+        st = os.stat(self.path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def _load_index(self):
+        """Read the index if it matches the history file, otherwise rebuild it"""
+        signature = self.signature
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if index.get('version') == INDEX_VERSION and index.get('source') == signature:
+                return index['keys']
+        except (OSError, ValueError):
+            pass
+        keys = self._build()
+        try:
+            atomic_write(self.index_path, json.dumps({'version': INDEX_VERSION, 'source': signature, 'keys': keys}),
+                         mode=0o644)
+        except OSError:
+            pass  # read-only history directory: the index is just not cached
+        return keys
+
+    def _build(self):
+        """Stream the sacct file into sorted per-key samples"""
+        keys = {}
+        with open(self.path, 'r', newline='') as f:
+            for record in iter_sacct(f):
+                names = [f'name:{record["job_name"]}']
+                if record['template']:
+                    names.append(f'template:{record["template"]}')
+                for key in names:
+                    entry = keys.setdefault(key, {'elapsed': [], 'memory': [], 'timeouts': 0, 'oom': 0})
+                    if record['state'] == 'COMPLETED':
+                        if record['elapsed'] is not None:
+                            entry['elapsed'].append(record['elapsed'])
+                        if record['memory']:
+                            entry['memory'].append(record['memory'])
+                    elif record['state'] == 'TIMEOUT':
+                        entry['timeouts'] += 1
+                    elif record['state'] == 'OUT_OF_MEMORY':
+                        entry['oom'] += 1
+        for entry in keys.values():
+            entry['elapsed'].sort()
+            entry['memory'].sort()
+        return keys
+
+    def lookup(self, job_name=None, template=None):
+        """History entry for a job name, falling back to the template; (key, entry) or (None, None)"""
+        for key in (f'name:{job_name}' if job_name else None, f'template:{template}' if template else None):
+            if key and key in self.keys:
+                return key, self.keys[key]
+        return None, None
+
+    def suggest(self, job_name=None, template=None, pct=DEFAULT_PERCENTILE):
+        """Suggested walltime and memory per node from the history, or None without enough samples"""
+        key, entry = self.lookup(job_name, template)
+        if entry is None:
+            return None
+        suggestion = {'basis': key, 'percentile': pct, 'samples': len(entry['elapsed']),
+                      'timeouts': entry['timeouts'], 'out_of_memory': entry['oom'],
+                      'time': None, 'memory': None}
+        if len(entry['elapsed']) >= MIN_SAMPLES:
+            minutes = percentile(entry['elapsed'], pct) * (1 + TIME_MARGIN)
+            minutes = max(math.ceil(minutes / TIME_STEP) * TIME_STEP, TIME_STEP)
+            suggestion['time'] = format_walltime(minutes)
+            suggestion['elapsed_p50'] = format_walltime(percentile(entry['elapsed'], 50))
+        if len(entry['memory']) >= MIN_SAMPLES:
+            num_bytes = percentile(entry['memory'], pct) * (1 + MEMORY_MARGIN)
+            suggestion['memory'] = f'{max(math.ceil(num_bytes / MEMORY_STEP), 1)}G'
+        return suggestion
+
+
+def right_size(spec, suggestion, time_key='time', memory_key='memory'):
+    """Apply a suggestion to a spec where it is tighter than the request
+
+    Returns the list of (key, old, new) changes. Walltime is never tightened
+    for jobs that have timed out, nor memory for jobs that ran out of it.
+    """
+    changes = []
+    if not suggestion:
+        return changes
+    requested = spec.get(time_key)
+    if suggestion['time'] and requested and not suggestion['timeouts']:
+        try:
+            if parse_walltime(suggestion['time']) < parse_walltime(requested):
+                spec[time_key] = suggestion['time']
+                changes.append((time_key, requested, suggestion['time']))
+        except ValueError:
+            pass
+    requested = spec.get(memory_key)
+    if suggestion['memory'] and requested and not suggestion['out_of_memory']:
+        try:
+            if parse_size(suggestion['memory']) < parse_size(requested):
+                spec[memory_key] = suggestion['memory']
+                changes.append((memory_key, requested, suggestion['memory']))
+        except ValueError:
+            pass
+    return changes
+
+
+_histories = {}
+
+
+def get_history(path):
+    """Return a shared UsageHistory, reloaded when the sacct file changes"""
+    history = _histories.get(path)
+    if history is None or history._source_signature() != history.signature:
+        history = _histories[path] = UsageHistory(path)
+    return history
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Script Importer
+Turn existing sbatch scripts back into job specs: #SBATCH directives, module
+loads, environment exports and commands, with srun prefixes the generator
+would add again removed and the matching application template detected.
+Whole project trees are parsed in parallel, and the resulting JSON Lines
+feed straight into --batch to regenerate them.
+"""
+
+import os
+
+from job_lint import HEREDOC_RE, Statement, parse_directive, split_words
+from job_parallel import PARALLEL_THRESHOLD, ordered_map
+from job_registry import is_mpi_command, needs_srun
+from job_telemetry import DEFAULT_INTERVAL
+
+SCRIPT_EXTENSIONS = ('.sh', '.slurm', '.sbatch', '.job')
+
+# #SBATCH option -> job spec field
+DIRECTIVE_FIELDS = {
+    'account': 'account', 'time': 'time', 'job_name': 'job_name', 'partition': 'partition',
+    'qos': 'qos', 'q': 'qos', 'array': 'array', 'a': 'array',
+    'nodes': 'nodes', 'ntasks': 'ntasks', 'ntasks_per_node': 'ntasks_per_node', 'cpus_per_task': 'cpus_per_task',
+    'mem': 'memory', 'mem_per_cpu': 'memory_per_cpu', 'tmp': 'tmp', 'gpus': 'gpus', 'G': 'gpus',
+    'mail_user': 'mail_user', 'mail_type': 'mail_type', 'output': 'output', 'o': 'output',
+    'error': 'error', 'e': 'error',
+}
+INT_FIELDS = ('nodes', 'ntasks', 'ntasks_per_node', 'cpus_per_task', 'gpus')
+DEFAULT_OUTPUT = 'slurm-%j.out'
+
+# Lines every generated script has; they are regenerated, not imported
+GENERATED_LINES = frozenset([
+    'echo "Job started at: $(date)"',
+    'echo "Job ID: $SLURM_JOB_ID"',
+    'echo "Node(s): $SLURM_JOB_NODELIST"',
+    'echo "Number of nodes: $SLURM_JOB_NUM_NODES"',
+    'echo "Working directory: $PWD"',
+    'echo ""',
+    'echo "Job completed at: $(date)"',
+    'module list',
+    'rm -f "$MPS_LAUNCHER"',
+])
+GENERATED_PREFIXES = ('export CUDA_MPS_PIPE_DIRECTORY=', 'export CUDA_MPS_LOG_DIRECTORY=')
+TELEMETRY_MARKERS = ('telemetry_begin ', 'telemetry_end ')
+HEADER_PREFIX = '# NREL HPC Job Script - '
+CLUSTER_PREFIX = '# Cluster: '
+
+
+def _logical_lines(text):
+    """(line number, physical lines, joined text) with backslash continuations joined"""
+    physical, joined, start = [], '', 0
+    for number, raw in enumerate(text.splitlines(), 1):
+        if not physical:
+            start = number
+        physical.append(raw)
+        stripped = raw.strip()
+        if stripped.endswith('\\') and not stripped.startswith('#'):
+            joined += stripped[:-1] + ' '
+            continue
+        yield start, physical, joined + stripped
+        physical, joined = [], ''
+    if physical:
+        yield start, physical, joined.strip()
+
+
+def _loop_paths(text):
+    """Paths of a generated staging loop: for path in a b c; do"""
+    words = split_words(text)
+    return words[3:words.index(';')] if ';' in words else words[3:]
+
+
+def detect_template(templates, header=None, modules=(), programs=()):
+    """Application template for a script: by its generator header, else by modules and programs"""
+    for key, template in templates.items():
+        if header and template.get('name') == header:
+            return key
+    best, best_score = 'general', 0
+    for key, template in templates.items():
+        bases = {module.split('/')[0].lower() for module in template.get('modules') or []}
+        if not bases:
+            continue
+        score = 2 * sum(1 for module in modules if module.split('/')[0].lower() in bases)
+        score += sum(1 for program in programs
+                     if any(program.startswith(indicator) for indicator in template.get('mpi_indicators', [])))
+        if score > best_score:
+            best, best_score = key, score
+    return best
+
+
+def parse_script(text, templates, name=None):
+    """Job spec for an sbatch script, and notes on what could not be carried over
+
+    ``name`` (usually the file name without extension) becomes the job name
+    when the script sets none, as sbatch itself does.
+    """
+    directives = {}
+    header = None
+    cluster = None
+    modules, environment, commands, notes = [], [], [], []
+    stage_in, stage_out = [], []
+    mps = hetjob = False
+    telemetry = None    # sample interval of a --telemetry script
+    heredoc = None
+    block = None        # generated block being skipped: 'mps', 'staging', 'telemetry', 'summary',
+                        # 'resilient', 'app', 'tail'
+    staging_out = False
+    seen_command = False
+
+    for number, physical, line in _logical_lines(text):
+        if heredoc:
+            if block != 'mps':
+                commands.append('\n'.join(physical))
+            if line == heredoc:
+                heredoc = None
+            continue
+        if line.startswith('#SBATCH'):
+            if hetjob:
+                continue
+            if seen_command:
+                notes.append(f'line {number}: #SBATCH after the first command was ignored by sbatch and is dropped')
+                continue
+            options = parse_directive(line[len('#SBATCH'):])
+            if 'hetjob' in options:
+                hetjob = True
+                notes.append('heterogeneous job: only the first component\'s directives are imported')
+                continue
+            directives.update(options)
+            continue
+        if line.startswith(HEADER_PREFIX):
+            header = line[len(HEADER_PREFIX):].strip()
+        elif line.startswith(CLUSTER_PREFIX) and not seen_command:
+            cluster = line[len(CLUSTER_PREFIX):].strip()
+        if not line or line.startswith('#'):
+            continue
+        seen_command = True
+
+        # Blocks the generator writes for --mps, --stage-in/out, --telemetry and --resilient
+        if line.startswith(TELEMETRY_MARKERS):
+            continue
+        if block == 'mps':
+            if line == 'chmod +x "$MPS_LAUNCHER"':
+                block = None
+            elif HEREDOC_RE.search(line):
+                heredoc = HEREDOC_RE.search(line).group(1)
+            continue
+        if block == 'staging':
+            if line.startswith('stage_out() {'):
+                staging_out = True
+            elif line.startswith('for path in'):
+                (stage_out if staging_out else stage_in).extend(_loop_paths(line))
+            elif line == '}':
+                staging_out = False
+            elif line == 'cd "$STAGE_DIR"':
+                block = None
+            continue
+        if block == 'telemetry':
+            if line.startswith('sleep '):
+                telemetry = int(line.split()[1])
+            elif line.startswith('TELEMETRY_START='):
+                block = None
+            continue
+        if block == 'summary':
+            if line == 'rm -rf "$TELEMETRY_DIR"':
+                block = None
+            continue
+        if block == 'resilient':
+            if line == '(':
+                block = 'app'
+            continue
+        if block == 'app':
+            if line == ') &':
+                # The subshell ends with a generated "exit $?"
+                if commands and commands[-1] == 'exit $?':
+                    commands.pop()
+                block = 'tail'
+                continue
+            command = '\n'.join(physical)
+            if command.endswith(' $RESTART_ARGS'):
+                command = command[:-len(' $RESTART_ARGS')]
+            match = HEREDOC_RE.search(line)
+            if match:
+                heredoc = match.group(1)
+            if command.strip() not in GENERATED_LINES:
+                commands.append(command)
+            continue
+        if block == 'tail':
+            if line == 'exit $status':
+                block = None
+            continue
+        if line.startswith('MPS_LAUNCHER='):
+            mps, block = True, 'mps'
+            continue
+        if line.startswith('TELEMETRY_DIR='):
+            telemetry, block = DEFAULT_INTERVAL, 'telemetry'
+            continue
+        if line == 'kill $TELEMETRY_PIDS 2>/dev/null':
+            block = 'summary'
+            continue
+        if line == 'SUBMIT_DIR=$PWD':
+            block = 'staging'
+            continue
+        if line == 'CHECKPOINT_SIGNAL=""':
+            block = 'resilient'
+            continue
+        if line in GENERATED_LINES or line.startswith(GENERATED_PREFIXES):
+            continue
+
+        words = split_words(line)
+        if words[:1] == ['module'] or words[:1] == ['ml']:
+            if words[0] == 'ml' or words[1:2] in (['load'], ['add']):
+                modules.extend(word for word in words[1 if words[0] == 'ml' else 2:] if not word.startswith('-'))
+            else:
+                notes.append(f'line {number}: "{line}" is not carried over')
+            continue
+        if words[:1] == ['export'] and not commands:
+            environment.append(line)
+            continue
+        match = HEREDOC_RE.search(line)
+        if match:
+            heredoc = match.group(1)
+        commands.append('\n'.join(physical))
+
+    spec = {}
+    for option, value in directives.items():
+        field = DIRECTIVE_FIELDS.get(option)
+        if field:
+            spec[field] = int(value) if field in INT_FIELDS and value.isdigit() else value
+    nodes = spec.get('nodes') if isinstance(spec.get('nodes'), int) else 1
+    for option in ('gpus_per_node', 'gres'):
+        value = directives.get(option, '')
+        count = value.rsplit(':', 1)[-1] if option == 'gpus_per_node' or value.startswith('gpu') else ''
+        if count.isdigit():
+            spec['gpus'] = int(count) * nodes
+
+    if directives.get('signal', '').startswith('B:USR1@') and 'requeue' in directives:
+        spec['resilient'] = True
+    handled = set(DIRECTIVE_FIELDS) | {'gpus_per_node', 'gres'}
+    if spec.get('resilient'):
+        handled |= {'signal', 'requeue', 'open_mode'}
+    if directives.get('comment', '').startswith('template='):
+        spec['right_size'] = True
+        handled.add('comment')
+    for option in directives:
+        if option not in handled:
+            notes.append(f'#SBATCH --{option.replace("_", "-")} is not supported by the generator and is dropped')
+    if spec.get('output') == DEFAULT_OUTPUT:
+        del spec['output']
+    if 'job_name' not in spec and name:
+        spec['job_name'] = name
+    if cluster:
+        spec['cluster'] = cluster
+
+    programs = []
+    for command in commands:
+        statement = Statement(0, split_words(command.split('\n')[0]))
+        launch = statement.launch()
+        program = launch[2][0] if launch and launch[2] else statement.command
+        if program:
+            programs.append(os.path.basename(program).lower())
+    template = detect_template(templates, header, modules, programs)
+    template_config = templates.get(template, {})
+    if template != 'general':
+        spec['template'] = template
+
+    # Modules and environment the template brings itself are not repeated
+    template_modules = template_config.get('modules') or []
+    template_bases = {module.split('/')[0].lower() for module in template_modules}
+    extra = []
+    for module in modules:
+        if module in template_modules:
+            continue
+        if module.split('/')[0].lower() in template_bases:
+            notes.append(f'module {module} is replaced by the {template} template\'s '
+                         f'{", ".join(template_modules)}')
+            continue
+        extra.append(module)
+    if extra:
+        spec['modules'] = extra
+    template_env = set(template_config.get('environment') or [])
+    environment = [line for line in environment if line not in template_env]
+    if environment:
+        spec['environment'] = environment
+
+    if mps:
+        spec['mps'] = True
+    if telemetry:
+        spec['telemetry'] = True
+        if telemetry != DEFAULT_INTERVAL:
+            spec['telemetry_interval'] = telemetry
+    spec_commands = _import_commands([c for c in commands if c.strip() not in template_env],
+                                     spec, template_config, notes)
+    if spec_commands:
+        spec['commands'] = spec_commands
+    if stage_in:
+        spec['stage_in'] = stage_in
+    if stage_out:
+        spec['stage_out'] = stage_out
+    return spec, notes
+
+
+def _import_commands(commands, spec, template_config, notes):
+    """Commands with the srun prefixes the generator adds back removed"""
+    ntasks, per_node, cpus = spec.get('ntasks'), spec.get('ntasks_per_node'), spec.get('cpus_per_task')
+    nodes = spec.get('nodes', 1)
+    wraps = (isinstance(nodes, int) and nodes > 1 or isinstance(ntasks, int) and ntasks > 1 or per_node
+             or isinstance(cpus, int) and cpus > 1)
+    # srun options the generated srun prefix would carry
+    expected = {'ntasks': ntasks, 'ntasks_per_node': per_node, 'cpus_per_task': cpus, 'nodes': nodes}
+    for flag in template_config.get('mpi_flags', []):
+        option, _, value = flag.partition('=')
+        expected[option] = value
+    # Binding the generator's GPU planner adds again
+    gpu_options = ('--gpus-per-task', '--gpu-bind') if spec.get('gpus') else ()
+
+    imported = []
+    for command in commands:
+        first = command.split('\n')[0]
+        words = split_words(first)
+        launch = Statement(0, words).launch() if '\n' not in command and words[:1] == ['srun'] else None
+        if launch and launch[2] and wraps:
+            _, options, program = launch
+            if spec.get('mps') and program[0] == '$MPS_LAUNCHER':
+                program = program[1:]
+            if program and all(str(expected.get(option)) == value or option in gpu_options
+                               for option, value in options.items()):
+                prefix = len(words) - len(program)
+                rest = first.split(None, prefix)[-1]
+                if is_mpi_command(template_config, rest):
+                    imported.append(rest)
+                    continue
+        elif wraps and needs_srun(template_config, command):
+            notes.append(f'"{first}" runs once here but will be launched with srun when regenerated')
+        imported.append(command)
+    return imported
+
+
+_worker_templates = None
+
+
+def _init_worker(templates):
+    global _worker_templates
+    _worker_templates = templates
+
+
+def import_file(path):
+    """(path, spec, notes) for one script file; runs in the worker processes
+
+    The spec is None if the file cannot be read.
+    """
+    try:
+        with open(path, 'r', errors='replace') as f:
+            text = f.read()
+    except OSError as e:
+        return path, None, [f'cannot read: {e.strerror}']
+    spec, notes = parse_script(text, _worker_templates, os.path.splitext(os.path.basename(path))[0])
+    return path, spec, notes
+
+
+def find_scripts(paths):
+    """Script files among the paths, searching directories recursively, in a stable order"""
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                scripts.extend(os.path.join(root, name) for name in sorted(names)
+                               if name.endswith(SCRIPT_EXTENSIONS))
+        else:
+            scripts.append(path)
+    return scripts
+
+
+def import_scripts(paths, templates, workers=None):
+    """Yield (path, spec, notes) for every script under the paths, in order
+
+    Large trees are parsed by a pool of ``workers`` processes (default: one
+    per CPU); results still come back in file order.
+    """
+    scripts = find_scripts(paths)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(scripts) < PARALLEL_THRESHOLD:
+        _init_worker(templates)
+        yield from map(import_file, scripts)
+        return
+    yield from ordered_map(import_file, scripts, workers, initializer=_init_worker, initargs=(templates,))
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Script Linter
+Catch the mistakes that otherwise only show up after hours in the queue:
+nested MPI launchers, applications run without their module, rank and thread
+counts that disagree with the #SBATCH directives, srun steps serialised in
+loops and directives sbatch never sees. Works on generated scripts and on
+existing .sh files alike; the script is tokenised once and every rule runs
+over the same statements.
+"""
+
+import os
+import re
+import shlex
+
+LAUNCHERS = frozenset(['srun', 'mpirun', 'mpiexec', 'mpiexec.hydra', 'aprun', 'ibrun'])
+
+# Short steps that are fine to run one after another (staging, setup)
+UTILITY_COMMANDS = frozenset(['cp', 'mkdir', 'mv', 'rm', 'rsync', 'tar', 'ln', 'touch', 'cat', 'echo',
+                              'hostname', 'date', 'true', 'sbcast'])
+
+# srun/mpirun options whose value may be the next word
+_VALUE_OPTIONS = frozenset([
+    '-n', '-N', '-c', '-t', '-p', '-J', '-o', '-e', '-G', '-m', '-w', '-x', '-A', '-np', '-ppn',
+    '--ntasks', '--nodes', '--ntasks-per-node', '--cpus-per-task', '--mpi', '--gpus', '--gpus-per-task',
+    '--gpus-per-node', '--het-group', '--gpu-bind', '--cpu-bind', '--distribution', '--export', '--output',
+    '--error', '--time', '--partition', '--job-name', '--mem', '--hostfile', '--host',
+])
+
+# Option spellings of the resource counts the rules compare
+_OPTION_NAMES = {
+    '-N': 'nodes', '--nodes': 'nodes',
+    '-n': 'ntasks', '--ntasks': 'ntasks', '-np': 'ntasks',
+    '--ntasks-per-node': 'ntasks_per_node', '-ppn': 'ntasks_per_node',
+    '-c': 'cpus_per_task', '--cpus-per-task': 'cpus_per_task',
+    '-t': 'time', '--time': 'time',
+    '-A': 'account', '--account': 'account',
+    '-J': 'job_name', '--job-name': 'job_name',
+    '-p': 'partition', '--partition': 'partition',
+}
+
+_LOOP_KEYWORDS = frozenset(['for', 'while', 'until', 'select'])
+_PREFIX_KEYWORDS = frozenset(['do', 'then', 'else', 'if', 'elif', '!', '{', '(', 'time', 'exec', 'command'])
+_CLOSING_KEYWORDS = frozenset(['fi', '}', ')', 'esac', 'done'])
+_KEYWORDS = _PREFIX_KEYWORDS | _CLOSING_KEYWORDS
+_SEPARATORS = frozenset([';', '&', '&&', '||', '|', ';;', '|&'])
+_ASSIGNMENT_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=')
+
+# Start of a here-document and its delimiter; "<<<" is a here-string, not one
+HEREDOC_RE = re.compile(r'(?<!<)<<-?(?!<)\s*[\'"]?(\w+)[\'"]?')
+
+
+def _finding(line, code, message, severity='warning'):
+    return {'line': line, 'code': code, 'message': message, 'severity': severity}
+
+
+class Statement:
+    """One simple command of the script, with where it sits"""
+
+    def __init__(self, line, words, background=False, loop_depth=0):
+        self.line = line
+        self.words = words
+        self.background = background
+        self.loop_depth = loop_depth
+
+    @property
+    def command(self):
+        """The command word after variable assignments, or None"""
+        for word in self.words:
+            if not _ASSIGNMENT_RE.match(word):
+                return os.path.basename(word)
+        return None
+
+    def launch(self):
+        """(launcher, {option: value}, program words) for srun/mpirun lines, else None"""
+        words = self.words
+        while words and _ASSIGNMENT_RE.match(words[0]):
+            words = words[1:]
+        if not words or os.path.basename(words[0]) not in LAUNCHERS:
+            return None
+        options = {}
+        index = 1
+        while index < len(words) and words[index].startswith('-'):
+            option, has_value, value = words[index].partition('=')
+            if not has_value and option in _VALUE_OPTIONS and index + 1 < len(words):
+                value = words[index + 1]
+                index += 1
+            elif not has_value and re.match(r'^-[nNc]\d+$', option):
+                option, value = option[:2], option[2:]
+            options[_OPTION_NAMES.get(option, option)] = value
+            index += 1
+        return os.path.basename(words[0]), options, words[index:]
+
+
+class ParsedScript:
+    """Directives and statements of a batch script"""
+
+    def __init__(self):
+        self.shebang = None
+        self.directives = {}
+        self.directive_lines = []
+        self.late_directives = []
+        self.statements = []
+        self.first_command_line = None
+
+
+def split_words(text):
+    """Words and control operators of a shell line; falls back to whitespace splitting"""
+    lexer = shlex.shlex(text, posix=True, punctuation_chars=';&|()')
+    lexer.whitespace_split = True
+    try:
+        return list(lexer)
+    except ValueError:  # unbalanced quotes, e.g. a string continued on the next line
+        return text.split()
+
+
+def parse_directive(text):
+    """Options of one #SBATCH line (without the prefix) as {name: value}"""
+    words = split_words(text)
+    options = {}
+    index = 0
+    while index < len(words):
+        option, has_value, value = words[index].partition('=')
+        if not has_value and option in _OPTION_NAMES and index + 1 < len(words):
+            value = words[index + 1]
+            index += 1
+        elif not has_value and re.match(r'^-[A-Za-z]\S', option):
+            option, value = option[:2], option[2:]
+        options[_OPTION_NAMES.get(option, option.lstrip('-').replace('-', '_'))] = value
+        index += 1
+    return options
+
+
+def tokenize(text):
+    """Parse a batch script into directives and statements in a single pass"""
+    parsed = ParsedScript()
+    loop_depth = 0
+    heredoc = None
+    pending = ''
+    pending_line = 0
+
+    for number, raw in enumerate(text.splitlines(), 1):
+        if heredoc:
+            if raw.strip() == heredoc:
+                heredoc = None
+            continue
+        if number == 1 and raw.startswith('#!'):
+            parsed.shebang = raw
+            continue
+
+        stripped = raw.strip()
+        if stripped.startswith('#SBATCH'):
+            if parsed.first_command_line is None:
+                parsed.directives.update(parse_directive(stripped[len('#SBATCH'):]))
+                parsed.directive_lines.append(number)
+            else:
+                parsed.late_directives.append(number)
+            continue
+
+        # Join backslash continuations into one logical line
+        if not pending:
+            pending_line = number
+        if stripped.endswith('\\'):
+            pending += stripped[:-1] + ' '
+            continue
+        line, pending = pending + stripped, ''
+        if not line or line.startswith('#'):
+            continue
+        if parsed.first_command_line is None:
+            parsed.first_command_line = pending_line
+
+        match = HEREDOC_RE.search(line)
+        if match:
+            heredoc = match.group(1)
+
+        words = []
+        for token in split_words(line) + [';']:
+            if token not in _SEPARATORS:
+                words.append(token)
+                continue
+            while words and words[0] in _KEYWORDS:
+                if words.pop(0) == 'done':
+                    loop_depth = max(loop_depth - 1, 0)
+            if words and words[0] in _LOOP_KEYWORDS:
+                # The loop header; the body follows after "do"
+                loop_depth += 1
+            elif words:
+                parsed.statements.append(Statement(pending_line, words, token in ('&', '|&'), loop_depth))
+            words = []
+    return parsed
+
+
+def _as_count(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None  # e.g. $SLURM_NTASKS
+
+
+def _on(cluster):
+    return f' on {cluster.capitalize()}' if cluster else ''
+
+
+def _rule_structure(parsed, templates, cluster):
+    if not parsed.shebang:
+        yield _finding(1, 'missing-shebang', 'The script must start with an interpreter line such as #!/bin/bash',
+                       'error')
+    for number in parsed.late_directives:
+        yield _finding(number, 'late-directive',
+                       '#SBATCH after the first command is ignored by sbatch; move it to the header', 'error')
+    first = parsed.directive_lines[0] if parsed.directive_lines else 1
+    if 'account' not in parsed.directives:
+        yield _finding(first, 'missing-account', f'No --account: jobs{_on(cluster)} must charge a project allocation',
+                       'error')
+    if 'time' not in parsed.directives:
+        yield _finding(first, 'missing-time', 'No --time: the job gets the partition default walltime')
+
+
+def _rule_launchers(parsed, templates, cluster):
+    for statement in parsed.statements:
+        launch = statement.launch()
+        if not launch:
+            continue
+        launcher, _, program = launch
+        nested = os.path.basename(program[0]) if program else None
+        if nested in LAUNCHERS:
+            yield _finding(statement.line, 'nested-launcher',
+                           f'{nested} inside {launcher} starts every rank {launcher} already started; '
+                           f'drop {nested} and let {launcher} launch the program', 'error')
+        elif launcher in ('mpirun', 'mpiexec', 'mpiexec.hydra'):
+            yield _finding(statement.line, 'prefer-srun',
+                           f'Launch MPI programs with srun{_on(cluster)}; {launcher} may place ranks '
+                           f'outside the Slurm allocation layout')
+
+
+def _rule_layout(parsed, templates, cluster):
+    directives = parsed.directives
+    if 'hetjob' in directives:
+        return  # the directives describe several components
+    nodes = _as_count(directives.get('nodes')) or 1
+    per_node = _as_count(directives.get('ntasks_per_node'))
+    tasks = _as_count(directives.get('ntasks')) or (nodes * per_node if per_node else None)
+    cpus = _as_count(directives.get('cpus_per_task'))
+
+    for statement in parsed.statements:
+        launch = statement.launch()
+        if launch:
+            launcher, options, _ = launch
+            requested = _as_count(options.get('ntasks'))
+            if requested and tasks and (requested > tasks or requested != tasks and launcher != 'srun'):
+                # srun steps may use part of the allocation; more ranks than tasks fail, and a
+                # hard-coded mpirun count that differs is almost always stale
+                yield _finding(statement.line, 'rank-mismatch',
+                               f'{launcher} starts {requested} ranks but the job has {tasks} tasks',
+                               'error' if requested > tasks else 'warning')
+            requested = _as_count(options.get('nodes'))
+            if requested and requested > nodes:
+                yield _finding(statement.line, 'rank-mismatch',
+                               f'{launcher} asks for {requested} nodes but the job has {nodes}', 'error')
+            requested = _as_count(options.get('ntasks_per_node'))
+            if requested and per_node and requested > per_node:
+                yield _finding(statement.line, 'rank-mismatch',
+                               f'{launcher} places {requested} ranks per node but the job has {per_node}', 'error')
+            requested = _as_count(options.get('cpus_per_task'))
+            if requested and cpus and requested > cpus:
+                yield _finding(statement.line, 'rank-mismatch',
+                               f'{launcher} asks for {requested} CPUs per task but the job has {cpus}', 'error')
+
+        if cpus:
+            for word in statement.words:
+                if word.startswith('OMP_NUM_THREADS='):
+                    threads = _as_count(word.split('=', 1)[1])
+                    if threads and threads != cpus:
+                        yield _finding(statement.line, 'thread-mismatch',
+                                       f'OMP_NUM_THREADS={threads} but the job has {cpus} CPUs per task')
+
+
+def _rule_steps(parsed, templates, cluster):
+    background = None
+    waited = False
+    for statement in parsed.statements:
+        if statement.command == 'wait':
+            waited = True
+            continue
+        launch = statement.launch()
+        if not launch or launch[0] != 'srun':
+            continue
+        program = os.path.basename(launch[2][0]) if launch[2] else None
+        if statement.background:
+            background = background or statement.line
+            waited = False
+        elif statement.loop_depth and program not in UTILITY_COMMANDS:
+            yield _finding(statement.line, 'serial-srun-loop',
+                           'srun in a loop without & runs the steps one after another; '
+                           'end the line with & and wait after the loop')
+    if background and not waited:
+        yield _finding(background, 'missing-wait',
+                       'srun steps started with & need a wait, or the job ends and kills them', 'error')
+
+
+def _rule_modules(parsed, templates, cluster):
+    loaded = set()
+    reported = set()
+    for statement in parsed.statements:
+        words = statement.words
+        if statement.command in ('module', 'ml'):
+            names = words[2:] if statement.command == 'module' and len(words) > 1 and words[1] in ('load', 'add') \
+                else words[1:] if statement.command == 'ml' else []
+            loaded.update(name.split('/')[0].lower() for name in names if not name.startswith('-'))
+            continue
+
+        launch = statement.launch()
+        program = launch[2][0] if launch and launch[2] else statement.command
+        if not program:
+            continue
+        program = os.path.basename(program).lower()
+        for name, template in (templates or {}).items():
+            modules = template.get('modules') or []
+            if not modules or not any(program.startswith(ind) for ind in template.get('mpi_indicators', [])):
+                continue
+            if not loaded & {module.split('/')[0].lower() for module in modules} and name not in reported:
+                reported.add(name)
+                yield _finding(statement.line, 'missing-module',
+                               f'{program} runs without its module; add "module load {modules[0]}" before it')
+
+
+RULES = [_rule_structure, _rule_launchers, _rule_layout, _rule_steps, _rule_modules]
+
+
+def lint_script(text, templates=None, cluster=None):
+    """Findings for a batch script, sorted by line
+
+    Each finding has line, code, message and severity ('error' or
+    'warning'). ``templates`` (the registry's application templates) lets
+    the linter check that applications run with their modules loaded;
+    ``cluster`` (the registry's cluster name) is named in the messages.
+    """
+    parsed = tokenize(text)
+    findings = []
+    for rule in RULES:
+        findings.extend(rule(parsed, templates, cluster))
+    return sorted(findings, key=lambda finding: finding['line'])
+
+
+def format_findings(findings, source='<script>'):
+    """Compiler-style lines: source:line: severity: message [code]"""
+    return [f"{source}:{f['line']}: {f['severity']}: {f['message']} [{f['code']}]" for f in findings]
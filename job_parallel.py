@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Parallel Rendering
+Spread bulk generation over every core: specs are rendered in chunks by a
+pool of worker processes while the main process takes the results back in
+spec order and hands the scripts to a few writer threads, so rendering,
+bookkeeping and file I/O overlap. Only a few chunks per worker are in flight
+at a time, so million-spec sweeps stream through in constant memory, and the
+output is identical to a serial run.
+"""
+
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from job_campaign import atomic_write
+
+# Fewer items than this (batch specs, imported scripts) are handled in-process;
+# a pool would only add startup time
+PARALLEL_THRESHOLD = 2000
+
+DEFAULT_CHUNK_SIZE = 250
+
+# Chunks queued per worker, so workers never wait for the main process
+CHUNKS_PER_WORKER = 4
+
+# Threads writing scripts; writes mostly wait on the file system
+WRITER_THREADS = 4
+
+# Seconds between progress lines on long runs
+PROGRESS_INTERVAL = 10
+
+
+def chunks(iterable, size):
+    """Lists of up to ``size`` consecutive items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def peek(iterable, count):
+    """(first ``count`` items, iterator over all items), to size up a stream without losing it"""
+    iterator = iter(iterable)
+    head = list(itertools.islice(iterator, count))
+    return head, itertools.chain(head, iterator)
+
+
+def _run_chunk(function, chunk):
+    return [function(item) for item in chunk]
+
+
+def ordered_map(function, items, workers, chunk_size=None, initializer=None, initargs=()):
+    """Yield ``function(item)`` for every item in order, computed by a pool of processes
+
+    ``function`` must be a module-level function; ``initializer(*initargs)``
+    runs once in each worker to set up what it needs.
+    """
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        for chunk in chunks(items, chunk_size):
+            pending.append(pool.submit(_run_chunk, function, chunk))
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class ScriptWriter:
+    """Write scripts from a thread pool; a failed write is raised by a later write or by close()"""
+
+    def __init__(self, threads=WRITER_THREADS):
+        self._pool = ThreadPoolExecutor(threads) if threads > 1 else None
+        self._pending = deque()
+        self._limit = threads * 64
+        self.bytes_written = 0
+
+    def write(self, path, text):
+        self.bytes_written += len(text)
+        if self._pool is None:
+            atomic_write(path, text)
+            return
+        self._pending.append(self._pool.submit(atomic_write, path, text))
+        while len(self._pending) > self._limit or (self._pending and self._pending[0].done()):
+            self._pending.popleft().result()
+
+    def close(self):
+        """Wait for every queued write"""
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
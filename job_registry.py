@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Template and Partition Registry
+Load application templates and partitions from a directory of JSON, YAML or
+TOML files, validate them and cache the parsed result until the files change.
+
+The top-level files describe the default cluster. Other clusters are profiles
+in ``clusters/<name>/``, laid out the same way: a profile's partitions replace
+the default partition table, and its application template entries are merged
+field by field over the default templates, so a profile usually only lists
+module names and MPI flags.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from job_resilience import CHECKPOINT_FIELDS
+from job_units import parse_size
+
+try:
+    import yaml
+except ImportError:  # PyYAML is optional
+    yaml = None
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+DEFAULT_REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'registry')
+
+# Subdirectory of the registry holding one directory per cluster profile
+CLUSTERS_DIR = 'clusters'
+
+# Name of the default cluster when its registry does not give one
+DEFAULT_CLUSTER = 'default'
+
+# Fields of the optional ``cluster`` section naming the system a registry describes
+CLUSTER_FIELDS = {
+    'name': str,
+    'description': str,
+}
+
+# Registry sections and the fields each entry may define.
+# field: (type(s), required, default)
+SCHEMAS = {
+    'partitions': {
+        'max_time': (str, True, None),
+        'description': (str, True, None),
+        'min_nodes': (int, False, 1),
+        'max_nodes': ((int, type(None)), False, None),
+        'memory_per_node': ((str, type(None)), False, None),
+        'local_disk': ((str, type(None)), False, None),
+        'gpus_per_node': (int, False, 0),
+        'auto_select': (bool, False, True),
+    },
+    'application_templates': {
+        'name': (str, True, None),
+        'description': (str, True, None),
+        'modules': (list, False, []),
+        'environment': (list, False, []),
+        'default_command': (str, False, 'echo "Add your commands here"'),
+        'mpi_flags': (list, False, []),
+        'recommended_partition': ((str, type(None)), False, None),
+        'partition_reason': ((str, type(None)), False, None),
+        'mpi_indicators': (list, False, []),
+        'serial_commands': (list, False, []),
+        'order': (int, False, 100),
+        'checkpoint': ((dict, type(None)), False, None),
+    },
+}
+
+
+class RegistryError(ValueError):
+    """Raised when registry files cannot be parsed or fail validation"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__('; '.join(self.errors))
+
+
+def parse_document(path):
+    """Parse a JSON, YAML or TOML document based on its extension"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        with open(path, 'r') as f:
+            return json.load(f)
+    if ext in ('.yaml', '.yml'):
+        if yaml is None:
+            raise RegistryError([f'{path}: PyYAML is required to read YAML files'])
+        with open(path, 'r') as f:
+            return yaml.safe_load(f) or {}
+    if ext == '.toml':
+        if tomllib is None:
+            raise RegistryError([f'{path}: tomllib/tomli is required to read TOML files'])
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    return None
+
+
+def validate_entry(section, key, entry, source='<registry>'):
+    """Validate one registry entry, returning (normalized_entry, errors)"""
+    errors = []
+    schema = SCHEMAS[section]
+    if not isinstance(entry, dict):
+        return None, [f'{source}: {section}.{key} must be a mapping']
+
+    normalized = {}
+    for field, (types, required, default) in schema.items():
+        if field not in entry:
+            if required:
+                errors.append(f'{source}: {section}.{key} is missing required field "{field}"')
+            normalized[field] = list(default) if isinstance(default, list) else default
+            continue
+        value = entry[field]
+        if not isinstance(value, types) or (types is int and isinstance(value, bool)):
+            errors.append(f'{source}: {section}.{key}.{field} has invalid type {type(value).__name__}')
+            continue
+        if isinstance(value, list) and not all(isinstance(item, str) for item in value):
+            errors.append(f'{source}: {section}.{key}.{field} must be a list of strings')
+            continue
+        normalized[field] = value
+
+    for field in entry:
+        if field not in schema:
+            errors.append(f'{source}: {section}.{key} has unknown field "{field}"')
+
+    return normalized, errors
+
+
+def validate_checkpoint(key, checkpoint):
+    """Validate a template's checkpoint/requeue settings, returning a list of errors"""
+    errors = []
+    for field, value in (checkpoint or {}).items():
+        prefix = f'application_templates.{key}.checkpoint.{field}'
+        if field not in CHECKPOINT_FIELDS:
+            errors.append(f'application_templates.{key}.checkpoint has unknown field "{field}"')
+        elif value is not None and not isinstance(value, CHECKPOINT_FIELDS[field][0]):
+            errors.append(f'{prefix} has invalid type {type(value).__name__}')
+        elif isinstance(value, list) and not all(isinstance(item, str) for item in value):
+            errors.append(f'{prefix} must be a list of strings')
+        elif field in ('default_size', 'write_rate') and value is not None:
+            try:
+                parse_size(value)
+            except ValueError:
+                errors.append(f'{prefix} "{value}" is not a valid size')
+    return errors
+
+
+class RegistrySnapshot:
+    """Immutable view of the parsed registry"""
+
+    def __init__(self, partitions, application_templates, version, cluster=None):
+        self.partitions = partitions
+        self.application_templates = application_templates
+        self.version = version
+        self.cluster = cluster or {'name': DEFAULT_CLUSTER, 'description': ''}
+        # Per-template content hashes, so a campaign only regenerates the
+        # scripts whose template actually changed
+        self.template_versions = {
+            key: hashlib.sha256(json.dumps(template, sort_keys=True).encode()).hexdigest()[:12]
+            for key, template in application_templates.items()
+        }
+
+
+class Registry:
+    """Cached, hot-reloadable registry of partitions and application templates"""
+
+    EXTENSIONS = ('.json', '.yaml', '.yml', '.toml')
+
+    def __init__(self, path=None, cluster=None):
+        self.path = os.path.abspath(path or os.environ.get('NREL_JOBGEN_REGISTRY') or DEFAULT_REGISTRY_DIR)
+        # Profile directory layered over the default registry, if any
+        self.cluster = cluster
+        self.profile_path = os.path.join(self.path, CLUSTERS_DIR, cluster) if cluster else None
+        if self.profile_path and not os.path.isdir(self.profile_path):
+            raise RegistryError([f'Unknown cluster "{cluster}": {self.profile_path} not found'])
+        self.last_errors = []
+        self._lock = threading.Lock()
+        self._signature = None
+        self._snapshot = None
+        self._watcher = None
+        self.refresh(strict=True)
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def partitions(self):
+        return self._snapshot.partitions
+
+    @property
+    def application_templates(self):
+        return self._snapshot.application_templates
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    @property
+    def template_versions(self):
+        return self._snapshot.template_versions
+
+    @property
+    def cluster_name(self):
+        return self._snapshot.cluster['name']
+
+    @property
+    def cluster_description(self):
+        return self._snapshot.cluster['description']
+
+    def _files(self):
+        """Return registry files sorted by relative path, the cluster profile's last"""
+        found = []
+        for top in filter(None, (self.path, self.profile_path)):
+            for root, dirs, files in os.walk(top):
+                if root == self.path and CLUSTERS_DIR in dirs:
+                    dirs.remove(CLUSTERS_DIR)
+                dirs.sort()
+                for name in sorted(files):
+                    if name.startswith('.') or not name.lower().endswith(self.EXTENSIONS):
+                        continue
+                    found.append(os.path.join(root, name))
+        return found
+
+    def _current_signature(self):
+        """Cheap fingerprint of the registry directory (paths, mtimes, sizes)"""
+        signature = []
+        for path in self._files():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def _load(self, files):
+        """Parse and validate all registry files into a snapshot"""
+        errors = []
+        entries_by_section = {section: {} for section in SCHEMAS}
+        profile = {section: {} for section in SCHEMAS}
+        cluster_sections = ({}, {})  # default registry's, profile's
+        digest = hashlib.sha256()
+
+        if not os.path.isdir(self.path):
+            raise RegistryError([f'Registry directory not found: {self.path}'])
+
+        for path in files:
+            source = os.path.relpath(path, self.path)
+            in_profile = self.profile_path is not None and path.startswith(self.profile_path + os.sep)
+            try:
+                document = parse_document(path)
+            except RegistryError as e:
+                errors.extend(e.errors)
+                continue
+            except Exception as e:
+                errors.append(f'{source}: {e}')
+                continue
+            if document is None:
+                continue
+            if not isinstance(document, dict):
+                errors.append(f'{source}: top level must be a mapping')
+                continue
+
+            for section, entries in document.items():
+                if section == 'cluster':
+                    errors.extend(self._read_cluster(entries, cluster_sections[in_profile], source))
+                    continue
+                if section not in SCHEMAS:
+                    errors.append(f'{source}: unknown section "{section}"')
+                    continue
+                if not isinstance(entries, dict):
+                    errors.append(f'{source}: section "{section}" must be a mapping')
+                    continue
+                target = profile if in_profile else entries_by_section
+                for key, entry in entries.items():
+                    target[section][key] = (entry, source)
+
+            digest.update(source.encode())
+            digest.update(json.dumps(document, sort_keys=True, default=str).encode())
+
+        # A profile's partitions replace the default table; its templates are
+        # merged field by field over the default ones
+        cluster = {'name': DEFAULT_CLUSTER, 'description': '', **cluster_sections[0]}
+        if self.cluster:
+            cluster = {**cluster_sections[1], 'name': self.cluster}
+            cluster.setdefault('description', '')
+            if profile['partitions']:
+                entries_by_section['partitions'] = profile['partitions']
+            templates = entries_by_section['application_templates']
+            for key, (entry, source) in profile['application_templates'].items():
+                default_entry = templates.get(key, ({}, source))[0]
+                if isinstance(entry, dict) and isinstance(default_entry, dict):
+                    entry = {**default_entry, **entry}
+                templates[key] = (entry, source)
+
+        sections = {section: {} for section in SCHEMAS}
+        for section, entries in entries_by_section.items():
+            for key, (entry, source) in entries.items():
+                normalized, entry_errors = validate_entry(section, key, entry, source)
+                errors.extend(entry_errors)
+                if not entry_errors:
+                    sections[section][key] = normalized
+
+        templates = sections['application_templates']
+        partitions = sections['partitions']
+        if 'general' not in templates:
+            errors.append('application_templates must define a "general" template')
+        for key, partition_info in partitions.items():
+            for field in ('memory_per_node', 'local_disk'):
+                if partition_info[field] is not None:
+                    try:
+                        parse_size(partition_info[field])
+                    except ValueError:
+                        errors.append(f'partitions.{key}.{field} "{partition_info[field]}" is not a valid size')
+        for key, template in templates.items():
+            partition = template['recommended_partition']
+            if partition and partition not in partitions:
+                profile_entry = profile['application_templates'].get(key, ({}, None))[0]
+                if self.cluster and 'recommended_partition' not in profile_entry:
+                    # Recommended on the default cluster, which has partitions this one lacks
+                    template['recommended_partition'] = template['partition_reason'] = None
+                else:
+                    errors.append(f'application_templates.{key}.recommended_partition "{partition}" '
+                                  f'is not a known partition')
+            errors.extend(validate_checkpoint(key, template['checkpoint']))
+
+        if errors:
+            raise RegistryError(errors)
+
+        ordered = dict(sorted(templates.items(), key=lambda item: (item[1]['order'], item[0])))
+        return RegistrySnapshot(partitions, ordered, digest.hexdigest()[:12], cluster)
+
+    def _read_cluster(self, section, cluster, source):
+        """Copy a ``cluster`` section into ``cluster``, returning a list of errors"""
+        if not isinstance(section, dict):
+            return [f'{source}: section "cluster" must be a mapping']
+        errors = []
+        for field, value in section.items():
+            if field not in CLUSTER_FIELDS:
+                errors.append(f'{source}: cluster has unknown field "{field}"')
+            elif not isinstance(value, CLUSTER_FIELDS[field]):
+                errors.append(f'{source}: cluster.{field} has invalid type {type(value).__name__}')
+            else:
+                cluster[field] = value
+        return errors
+
+    def refresh(self, strict=False):
+        """Reload the registry if any file changed. Returns True if reloaded.
+
+        A registry that fails validation keeps serving the previous snapshot
+        and records the problems in ``last_errors`` unless ``strict`` is set.
+        """
+        with self._lock:
+            signature = self._current_signature()
+            if signature == self._signature and self._snapshot is not None:
+                return False
+            try:
+                snapshot = self._load([path for path, _, _ in signature])
+            except RegistryError as e:
+                self.last_errors = e.errors
+                if strict or self._snapshot is None:
+                    raise
+                self._signature = signature
+                return False
+            self._snapshot = snapshot
+            self._signature = signature
+            self.last_errors = []
+            return True
+
+    def watch(self, interval=2.0):
+        """Poll for registry changes in a background thread"""
+        if self._watcher is not None:
+            return self._watcher
+        stop = threading.Event()
+
+        def _poll():
+            while not stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    pass
+
+        self._watcher = threading.Thread(target=_poll, name='registry-watcher', daemon=True)
+        self._watcher.stop = stop
+        self._watcher.start()
+        return self._watcher
+
+
+_registries = {}
+
+
+def get_registry(path=None, cluster=None):
+    """Return a shared Registry for the given directory and cluster profile
+
+    The cluster defaults to $NREL_JOBGEN_CLUSTER, then the default cluster;
+    every profile is loaded (and its lookup tables built) once per process.
+    """
+    default = _default_registry(path)
+    cluster = cluster or os.environ.get('NREL_JOBGEN_CLUSTER')
+    if not cluster or cluster == default.cluster_name:
+        return default
+    if (default.path, cluster) not in _registries:
+        _registries[(default.path, cluster)] = Registry(default.path, cluster)
+    return _registries[(default.path, cluster)]
+
+
+def _default_registry(path):
+    key = os.path.abspath(path or os.environ.get('NREL_JOBGEN_REGISTRY') or DEFAULT_REGISTRY_DIR)
+    if (key, None) not in _registries:
+        _registries[(key, None)] = Registry(key)
+    return _registries[(key, None)]
+
+
+def cluster_names(path=None):
+    """Names of the default cluster and every cluster profile in a registry"""
+    registry = _default_registry(path)
+    profiles_dir = os.path.join(registry.path, CLUSTERS_DIR)
+    profiles = sorted(name for name in os.listdir(profiles_dir)
+                      if os.path.isdir(os.path.join(profiles_dir, name))) if os.path.isdir(profiles_dir) else []
+    return [registry.cluster_name] + [name for name in profiles if name != registry.cluster_name]
+
+
+def is_mpi_command(template_config, command):
+    """Check if a command appears to be an MPI/parallel program for a template"""
+    cmd_lower = command.lower()
+    if any(serial in cmd_lower for serial in template_config.get('serial_commands', [])):
+        return False
+    return any(indicator in cmd_lower for indicator in template_config.get('mpi_indicators', []))
+
+
+def needs_srun(template_config, command):
+    """Check if a command should be launched with srun: an MPI program not already launched"""
+    if command.lstrip().startswith('srun '):
+        return False
+    return is_mpi_command(template_config, command)
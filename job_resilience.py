@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Checkpoint/Requeue Mode
+Make long jobs survive the time limit and preemption: Slurm signals the batch
+script ahead of the limit, the script asks the application to checkpoint
+(per template, see the ``checkpoint`` entry in the registry), requeues itself
+and resumes from the checkpoint on the next run.
+"""
+
+from job_lint import HEREDOC_RE
+from job_units import parse_size
+
+CHECKPOINT_SIGNAL = 'USR1'
+
+# Sustained checkpoint write rate per node (bytes/s) when a template does not
+# set one; conservative for Lustre on Kestrel
+DEFAULT_WRITE_RATE = '1G'
+
+# Slurm may deliver the signal up to a minute late, and the application needs
+# time to notice it and start writing
+SIGNAL_MARGIN = 120
+
+# Largest lead time --signal accepts, in seconds
+MAX_SIGNAL_TIME = 65535
+
+# Keys of a template's ``checkpoint`` entry: (type, description)
+CHECKPOINT_FIELDS = {
+    'signal_commands': (list, 'lines run when the checkpoint signal arrives; $APP_PID is the application'),
+    'restart_check': (str, 'shell condition that is true when a checkpoint to resume from exists'),
+    'restart_commands': (list, 'lines run before the application when resuming'),
+    'restart_args': (str, 'arguments added to the application command when resuming'),
+    'default_size': (str, 'typical checkpoint size, used when the job does not give one'),
+    'write_rate': (str, 'checkpoint write rate per node per second'),
+}
+
+
+def checkpoint_bytes(size=None, template_config=None, memory_per_node=0, nodes=1):
+    """Estimate the size of one checkpoint in bytes
+
+    An explicit size wins, then the template's typical size; otherwise the
+    memory footprint of the job is assumed to be written out.
+    """
+    if size:
+        return parse_size(size)
+    checkpoint = (template_config or {}).get('checkpoint') or {}
+    if checkpoint.get('default_size'):
+        return parse_size(checkpoint['default_size'])
+    return (memory_per_node or 0) * max(nodes, 1)
+
+
+def signal_lead_time(num_bytes, nodes=1, write_rate=None):
+    """Seconds before the time limit the checkpoint signal must arrive
+
+    Nodes write their share of the checkpoint in parallel; the result is
+    rounded up to whole minutes, the granularity Slurm signals with.
+    """
+    rate = parse_size(write_rate or DEFAULT_WRITE_RATE)
+    seconds = SIGNAL_MARGIN + num_bytes / (rate * max(nodes, 1))
+    minutes = -(-int(seconds) // 60)
+    return min(minutes * 60, MAX_SIGNAL_TIME)
+
+
+def resilience_directives(lead_time):
+    """#SBATCH lines that request the early signal and allow requeueing"""
+    return [
+        f'#SBATCH --signal=B:{CHECKPOINT_SIGNAL}@{lead_time}',
+        '#SBATCH --requeue',
+        '#SBATCH --open-mode=append',
+    ]
+
+
+def resilient_execution(lines, template_config, lead_time, is_app_command, epilogue=()):
+    """Wrap the job execution lines with the signal trap and restart logic
+
+    The commands run in the background so the batch shell can run its trap
+    while the application is busy; ``is_app_command(line)`` selects the lines
+    that get the template's restart arguments. ``epilogue`` lines run once the
+    application has exited, before the job is requeued.
+    """
+    checkpoint = template_config.get('checkpoint') or {}
+    restart_args = checkpoint.get('restart_args')
+    indent = '    '
+
+    wrapped = [
+        f'# Checkpoint/requeue: Slurm sends {CHECKPOINT_SIGNAL} to this script {lead_time // 60} min before',
+        '# the time limit; preemption sends TERM. Either way the application checkpoints,',
+        '# and the job resumes from the checkpoint when it runs again.',
+        'CHECKPOINT_SIGNAL=""',
+        'RESTART_ARGS=""',
+        'checkpoint() {',
+        f'{indent}CHECKPOINT_SIGNAL=$1',
+        f'{indent}echo "Received $1 at $(date): checkpointing"',
+    ]
+    wrapped.extend(indent + line for line in checkpoint.get('signal_commands', []))
+    wrapped.extend([
+        '}',
+        f"trap 'checkpoint {CHECKPOINT_SIGNAL}' {CHECKPOINT_SIGNAL}",
+        "trap 'checkpoint TERM' TERM",
+        '',
+    ])
+
+    if checkpoint.get('restart_check'):
+        wrapped.append(f'if [ "${{SLURM_RESTART_COUNT:-0}}" -gt 0 ] && {checkpoint["restart_check"]}; then')
+        wrapped.append(f'{indent}echo "Restart $SLURM_RESTART_COUNT: resuming from checkpoint"')
+        wrapped.extend(indent + line for line in checkpoint.get('restart_commands', []))
+        if restart_args:
+            wrapped.append(f'{indent}RESTART_ARGS="{restart_args}"')
+        wrapped.extend(['fi', ''])
+
+    # The job completion message stays outside the background block
+    body = list(lines)
+    tail = []
+    while body and (not body[-1].strip() or body[-1].startswith('echo "Job completed')):
+        tail.insert(0, body.pop())
+
+    # Not indented: here-documents in the commands need their terminator in column 0
+    wrapped.append('(')
+    heredoc = None
+    for line in body:
+        stripped = line.strip()
+        if heredoc:
+            heredoc = None if stripped == heredoc else heredoc
+        elif restart_args and stripped and not stripped.startswith('#') and is_app_command(line):
+            line = f'{line} $RESTART_ARGS'
+        match = None if heredoc else HEREDOC_RE.search(stripped)
+        if match:
+            heredoc = match.group(1)
+        wrapped.append(line if stripped else '')
+    wrapped.extend([
+        # Without a command after it, bash would exec a lone command in place of
+        # the subshell and $APP_PID would have no children for pkill -P to signal
+        'exit $?',
+        ') &',
+        'APP_PID=$!',
+        '# wait returns whenever a trap runs, so keep waiting until the application exits',
+        'while true; do',
+        f'{indent}wait "$APP_PID"',
+        f'{indent}status=$?',
+        f'{indent}kill -0 "$APP_PID" 2>/dev/null || break',
+        'done',
+        '',
+    ])
+    if epilogue:
+        wrapped.extend(list(epilogue) + [''])
+    wrapped.extend([
+        f'if [ "$CHECKPOINT_SIGNAL" = "{CHECKPOINT_SIGNAL}" ]; then',
+        f'{indent}# Slurm requeues preempted jobs itself; the time limit needs an explicit requeue',
+        f'{indent}echo "Requeueing job $SLURM_JOB_ID to continue from the checkpoint"',
+        f'{indent}scontrol requeue "$SLURM_JOB_ID"',
+        'fi',
+    ])
+    wrapped.extend(tail)
+    wrapped.append('exit $status')
+    return wrapped
+
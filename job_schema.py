@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Job Specification Schema
+Declarative description of a job spec and a validator compiled from it once,
+returning structured, field-addressed errors.
+"""
+
+import re
+from functools import lru_cache
+
+from job_gpu import plan_gpu_launch
+from job_registry import cluster_names
+from job_resilience import checkpoint_bytes, signal_lead_time
+from job_units import format_size, parse_size
+
+WALLTIME_RE = re.compile(r'^\d{1,2}:\d{2}:\d{2}$|^\d+-\d{1,2}:\d{2}:\d{2}$|^\d+$')
+_WALLTIME_PARTS_RE = re.compile(r'^(?:(\d+)-)?(\d{1,2}):(\d{2}):(\d{2})$')
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+ACCOUNT_RE = re.compile(r'^[A-Za-z0-9_.-]+$')
+NO_SPACE_RE = re.compile(r'^\S+$')
+ARRAY_RE = re.compile(r'^\d+(?:-\d+(?::\d+)?)?(?:,\d+(?:-\d+(?::\d+)?)?)*(?:%\d+)?$')
+
+MAIL_TYPES = frozenset([
+    'NONE', 'BEGIN', 'END', 'FAIL', 'REQUEUE', 'ALL', 'INVALID_DEPEND', 'STAGE_OUT',
+    'TIME_LIMIT', 'TIME_LIMIT_90', 'TIME_LIMIT_80', 'TIME_LIMIT_50', 'ARRAY_TASKS'
+])
+
+QOS_OPTIONS = ('normal', 'high', 'standby')
+
+# Values already known to be valid are remembered per field; batch campaigns
+# repeat the same handful of walltimes, partitions and sizes many times.
+VALID_CACHE_SIZE = 4096
+CACHEABLE_TYPES = (str, int)
+
+# Canonical spec fields (named after the CLI options) and their rules.
+# Other front ends map their own field names onto these, see WEB_FIELD_NAMES.
+JOB_SPEC_FIELDS = {
+    'account':         {'kind': 'pattern', 'required': True, 'pattern': ACCOUNT_RE,
+                        'message': 'Account may only contain letters, digits, "_", "-" and "."'},
+    'time':            {'kind': 'walltime', 'required': True},
+    'job_name':        {'kind': 'pattern', 'pattern': NO_SPACE_RE,
+                        'message': 'Job name must not contain whitespace'},
+    'cluster':         {'kind': 'cluster'},
+    'template':        {'kind': 'template'},
+    'partition':       {'kind': 'partition'},
+    'qos':             {'kind': 'choice', 'choices': QOS_OPTIONS},
+    'array':           {'kind': 'pattern', 'pattern': ARRAY_RE,
+                        'message': 'Invalid array specification. Use e.g. 1-100, 1,3,5, 0-99:2 or 1-100%10'},
+    'nodes':           {'kind': 'int', 'min': 1},
+    'ntasks':          {'kind': 'int', 'min': 1},
+    'ntasks_per_node': {'kind': 'int', 'min': 1},
+    'cpus_per_task':   {'kind': 'int', 'min': 1},
+    'memory':          {'kind': 'memory'},
+    'memory_per_cpu':  {'kind': 'memory'},
+    'gpus':            {'kind': 'int', 'min': 1},
+    'tmp':             {'kind': 'memory'},
+    'mail_user':       {'kind': 'pattern', 'pattern': EMAIL_RE,
+                        'message': 'Invalid email address'},
+    'mail_type':       {'kind': 'mail_type'},
+    'checkpoint_size': {'kind': 'memory'},
+    'telemetry_interval': {'kind': 'int', 'min': 1},
+}
+
+FIELD_LABELS = {
+    'account': 'Account/Project handle',
+    'time': 'Walltime',
+    'nodes': 'Number of nodes',
+    'ntasks': 'Number of tasks',
+    'ntasks_per_node': 'Tasks per node',
+    'cpus_per_task': 'CPUs per task',
+    'gpus': 'Number of GPUs',
+    'memory': 'Memory',
+    'memory_per_cpu': 'Memory per CPU',
+    'tmp': 'Local scratch storage',
+    'checkpoint_size': 'Checkpoint size',
+    'telemetry_interval': 'Telemetry sample interval',
+}
+
+# Canonical field -> name used by the web form/API
+WEB_FIELD_NAMES = {
+    'time': 'walltime',
+    'template': 'application_template',
+    'tmp': 'tmp_storage',
+    'mail_user': 'email',
+}
+
+
+@lru_cache(maxsize=1024)
+def parse_walltime(value):
+    """Convert a Slurm walltime (minutes, HH:MM:SS or D-HH:MM:SS) to minutes"""
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    match = _WALLTIME_PARTS_RE.match(value)
+    if not match:
+        raise ValueError(f'Invalid walltime: {value}')
+    days, hours, minutes, seconds = match.groups()
+    return int(days or 0) * 1440 + int(hours) * 60 + int(minutes) + int(seconds) / 60.0
+
+
+def _error(field, code, message, severity='error', suggestion=None):
+    error = {'field': field, 'code': code, 'message': message, 'severity': severity}
+    if suggestion:
+        error['suggestion'] = suggestion
+    return error
+
+
+def _as_int(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, int):
+        return value
+    return int(str(value).strip())
+
+
+class CompiledTables:
+    """Lookup tables and field checks compiled from one registry version
+
+    Built in full and then swapped in, so a validation running while the
+    registry reloads never sees a half-built set of tables.
+    """
+
+    def __init__(self, version, partitions, templates, limits, capacity, checks, required):
+        self.version = version
+        self.partitions = partitions
+        self.templates = templates
+        self.limits = limits
+        self.capacity = capacity
+        self.checks = checks
+        self.required = required
+
+
+class JobSpecSchema:
+    """Validator compiled once from JOB_SPEC_FIELDS and the registry
+
+    ``field_names`` maps canonical field names to the keys used by the caller
+    (e.g. WEB_FIELD_NAMES), so specs are validated in place without renaming.
+    """
+
+    def __init__(self, registry, field_names=None):
+        self.registry = registry
+        self.field_names = dict((field, (field_names or {}).get(field, field)) for field in JOB_SPEC_FIELDS)
+        self._compile()
+
+    def _compile(self):
+        """Build the partition tables and one check function per field"""
+        snapshot = self.registry.snapshot
+        partitions = snapshot.partitions
+        limits = {}
+        capacity = {}
+        for name, info in partitions.items():
+            try:
+                max_minutes = parse_walltime(info['max_time'])
+            except ValueError:
+                max_minutes = None
+            limits[name] = (info.get('min_nodes') or 1, info.get('max_nodes'), max_minutes)
+            capacity[name] = (
+                parse_size(info['memory_per_node']) if info.get('memory_per_node') else None,
+                parse_size(info['local_disk']) if info.get('local_disk') else 0,
+                info.get('gpus_per_node') or 0,
+            )
+
+        tables = CompiledTables(snapshot.version, partitions, snapshot.application_templates,
+                                limits, capacity, [], [])
+        for field, rule in JOB_SPEC_FIELDS.items():
+            key = self.field_names[field]
+            if rule.get('required'):
+                tables.required.append((key, f'{FIELD_LABELS.get(field, key)} is required'))
+            check = getattr(self, '_compile_' + rule['kind'])(field, key, rule, tables)
+            tables.checks.append((key, check, set()))
+        self._tables = tables
+        return tables
+
+    def _compile_pattern(self, field, key, rule, tables):
+        match = rule['pattern'].match
+        message = rule['message']
+
+        def check(value):
+            if not match(str(value)):
+                return _error(key, 'format', message)
+        return check
+
+    def _compile_walltime(self, field, key, rule, tables):
+        match = WALLTIME_RE.match
+
+        def check(value):
+            if not match(str(value)):
+                return _error(key, 'format', 'Invalid walltime format. Use HH:MM:SS, D-HH:MM:SS, or minutes')
+        return check
+
+    def _compile_choice(self, field, key, rule, tables):
+        choices = frozenset(rule['choices'])
+        message = f'Invalid {key}. Choose from: {", ".join(rule["choices"])}'
+
+        def check(value):
+            if not isinstance(value, str):
+                return _error(key, 'type', f'Invalid {key}: expected a name, got {type(value).__name__}')
+            if value not in choices:
+                return _error(key, 'choice', message)
+        return check
+
+    def _compile_cluster(self, field, key, rule, tables):
+        return self._compile_choice(field, key, {'choices': cluster_names(self.registry.path)}, tables)
+
+    def _compile_template(self, field, key, rule, tables):
+        return self._compile_choice(field, key, {'choices': list(tables.templates)}, tables)
+
+    def _compile_partition(self, field, key, rule, tables):
+        return self._compile_choice(field, key, {'choices': list(tables.partitions)}, tables)
+
+    def _compile_int(self, field, key, rule, tables):
+        minimum = rule.get('min')
+        label = FIELD_LABELS.get(field, key)
+
+        def check(value):
+            try:
+                number = _as_int(value)
+            except (TypeError, ValueError):
+                return _error(key, 'type', f'Invalid {label.lower()}')
+            if minimum is not None and number < minimum:
+                return _error(key, 'range', f'{label} must be at least {minimum}')
+        return check
+
+    def _compile_memory(self, field, key, rule, tables):
+        label = FIELD_LABELS.get(field, key)
+
+        def check(value):
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                return _error(key, 'type', f'Invalid {label.lower()}: expected a size, got {type(value).__name__}')
+            try:
+                parse_size(value)
+            except ValueError:
+                return _error(key, 'format', f'Invalid {label.lower()} "{value}". Use a number with an optional K/M/G/T suffix (e.g., 50GB)')
+        return check
+
+    def _compile_mail_type(self, field, key, rule, tables):
+        def check(value):
+            unknown = [t for t in str(value).upper().split(',') if t.strip() not in MAIL_TYPES]
+            if unknown:
+                return _error(key, 'choice', f'Unknown mail type(s): {", ".join(unknown)}')
+        return check
+
+    def validate(self, spec):
+        """Validate a job spec, returning a list of structured errors/warnings"""
+        tables = self._tables
+        if tables.version != self.registry.version:
+            tables = self._compile()
+
+        errors = []
+        get = spec.get
+        for key, message in tables.required:
+            if not get(key):
+                errors.append(_error(key, 'required', message))
+
+        for key, check, valid in tables.checks:
+            value = get(key)
+            if value is None or value == '':
+                continue
+            # Only plain strings and ints are cached: True == 1 == 1.0 share
+            # a hash, but only 1 passes the int checks
+            cacheable = type(value) in CACHEABLE_TYPES
+            if cacheable and value in valid:
+                continue
+            error = check(value)
+            if error:
+                errors.append(error)
+            elif cacheable and len(valid) < VALID_CACHE_SIZE:
+                valid.add(value)
+
+        if not errors:
+            self._check_consistency(spec, errors, tables)
+        return errors
+
+    def _check_consistency(self, spec, errors, tables):
+        """Cross-field checks; only run once every field parsed cleanly"""
+        names = self.field_names
+        get = spec.get
+        nodes = _as_int(get(names['nodes']) or 1)
+        ntasks = get(names['ntasks'])
+        ntasks_per_node = get(names['ntasks_per_node'])
+
+        if ntasks and ntasks_per_node:
+            ntasks, ntasks_per_node = _as_int(ntasks), _as_int(ntasks_per_node)
+            if ntasks > nodes * ntasks_per_node:
+                errors.append(_error(names['ntasks'], 'consistency',
+                                     f'{ntasks} tasks do not fit on {nodes} node(s) at {ntasks_per_node} tasks per node'))
+        # sbatch accepts this and shrinks the allocation to one node per task
+        if ntasks and _as_int(ntasks) < nodes:
+            errors.append(_error(names['ntasks'], 'consistency',
+                                 f'{_as_int(ntasks)} tasks cannot be spread over {nodes} nodes; '
+                                 f'Slurm will allocate only {_as_int(ntasks)}', severity='warning'))
+
+        if get(names['memory']) and get(names['memory_per_cpu']):
+            errors.append(_error(names['memory_per_cpu'], 'conflict',
+                                 'Memory per node and memory per CPU are mutually exclusive; memory per node is used',
+                                 severity='warning'))
+
+        if get('resilient'):
+            self._check_lead_time(spec, errors, tables)
+        self._check_gpus(spec, errors, tables)
+        
+        partition = get(names['partition'])
+        if (get('stage_in') or get('stage_out')) and partition in tables.capacity \
+                and not tables.capacity[partition][1]:
+            errors.append(_error('stage_in', 'staging', f'Partition {partition} has no local disk; staged files '
+                                 f'share node memory (use nvme, bigmem or a GPU partition)', severity='warning'))
+        
+        if partition:
+            min_nodes, max_nodes, max_minutes = tables.limits[partition]
+            if nodes < min_nodes:
+                errors.append(_error(names['nodes'], 'partition',
+                                     f'Partition {partition} requires at least {min_nodes} nodes'))
+            if max_nodes is not None and nodes > max_nodes:
+                errors.append(_error(names['nodes'], 'partition',
+                                     f'Partition {partition} allows at most {max_nodes} nodes'))
+            if max_minutes is not None and parse_walltime(get(names['time'])) > max_minutes:
+                errors.append(_error(names['time'], 'partition',
+                                     f'Walltime exceeds the {tables.partitions[partition]["max_time"]} limit of partition {partition}'))
+            self._check_fit(spec, partition, errors, tables)
+        else:
+            needs = self.requirements(spec)
+            if (needs['memory'] or needs['tmp'] or needs['gpus']) and not self.suggest_partition(spec, needs, tables):
+                field = needs['memory_field'] if needs['memory'] else ('tmp' if needs['tmp'] else 'gpus')
+                errors.append(_error(names[field], 'capacity', 'No partition has nodes large enough for this request'))
+
+    def _check_gpus(self, spec, errors, tables):
+        """Warn about GPU layouts the launch planner cannot bind well"""
+        names = self.field_names
+        partition = spec.get(names['partition'])
+        gpus_per_node = tables.capacity[partition][2] if partition in tables.capacity else 0
+        if not spec.get(names['gpus']):
+            if gpus_per_node:
+                errors.append(_error(names['gpus'], 'gpu', f'Partition {partition} is for GPU jobs but no GPUs '
+                                     f'are requested', severity='warning'))
+            return
+        plan = self.gpu_plan(spec)
+        for note in plan.notes:
+            errors.append(_error(names['gpus'], 'gpu', note, severity='warning'))
+
+    def gpu_plan(self, spec):
+        """GPU directives, binding and MPS setup for a spec (see job_gpu), or None without GPUs"""
+        names = self.field_names
+        get = spec.get
+        return plan_gpu_launch(_as_int(get(names['gpus']) or 0), _as_int(get(names['nodes']) or 1),
+                               _as_int(get(names['ntasks']) or 0) or None,
+                               _as_int(get(names['ntasks_per_node']) or 0) or None,
+                               bool(get('mps')))
+
+    def _check_lead_time(self, spec, errors, tables):
+        """The checkpoint signal has to leave most of the walltime for computing"""
+        names = self.field_names
+        lead_minutes = self.checkpoint_lead_time(spec, tables) / 60
+        minutes = parse_walltime(spec.get(names['time']))
+        if lead_minutes >= minutes:
+            errors.append(_error(names['time'], 'checkpoint',
+                                 f'Walltime is shorter than the {lead_minutes:.0f} min needed to write a checkpoint'))
+        elif lead_minutes >= minutes / 2:
+            errors.append(_error(names['time'], 'checkpoint',
+                                 f'Checkpointing starts {lead_minutes:.0f} min before the time limit, '
+                                 f'at least half of the walltime', severity='warning'))
+
+    def checkpoint_lead_time(self, spec, tables=None):
+        """Seconds before the time limit a resilient job is signalled to checkpoint
+
+        Derived from the checkpoint size: the given checkpoint size, else the
+        template's typical size, else the job's memory (or its nodes' memory).
+        """
+        names = self.field_names
+        tables = tables or self._tables
+        template = tables.templates.get(spec.get(names['template']) or 'general', tables.templates['general'])
+        needs = self.requirements(spec)
+        memory = needs['memory']
+        partition = spec.get(names['partition'])
+        if not memory and partition in tables.capacity:
+            memory = tables.capacity[partition][0] or 0
+        size = checkpoint_bytes(spec.get(names['checkpoint_size']), template, memory, needs['nodes'])
+        write_rate = (template.get('checkpoint') or {}).get('write_rate')
+        return signal_lead_time(size, needs['nodes'], write_rate)
+
+    def requirements(self, spec):
+        """Normalised per-node requirements of a spec: memory and tmp in bytes, GPUs, nodes"""
+        names = self.field_names
+        get = spec.get
+        nodes = _as_int(get(names['nodes']) or 1)
+        memory, memory_field = 0, 'memory'
+        if get(names['memory']):
+            memory = parse_size(get(names['memory']))
+        elif get(names['memory_per_cpu']):
+            memory = parse_size(get(names['memory_per_cpu'])) * self._cpus_per_node(spec, nodes)
+            memory_field = 'memory_per_cpu'
+        tmp = parse_size(get(names['tmp'])) if get(names['tmp']) else 0
+        gpus = _as_int(get(names['gpus']) or 0)
+        return {'memory': memory, 'memory_field': memory_field, 'tmp': tmp, 'gpus': gpus, 'nodes': nodes}
+
+    def _cpus_per_node(self, spec, nodes):
+        """Estimate the CPUs a spec uses on its busiest node"""
+        names = self.field_names
+        get = spec.get
+        cpus_per_task = _as_int(get(names['cpus_per_task']) or 1)
+        if get(names['ntasks_per_node']):
+            return _as_int(get(names['ntasks_per_node'])) * cpus_per_task
+        if get(names['ntasks']):
+            return -(-_as_int(get(names['ntasks'])) // nodes) * cpus_per_task
+        return cpus_per_task
+
+    def _fits(self, partition, needs, tables):
+        """Return the list of (field, problem, severity) reasons a partition cannot hold a job"""
+        memory, disk, gpus_per_node = tables.capacity[partition]
+        problems = []
+        # --mem=0 asks for all memory on the node, which always fits
+        if memory is not None and needs['memory'] > memory:
+            problems.append((needs['memory_field'], f'{format_size(needs["memory"])} of memory per node exceeds the '
+                                       f'{format_size(memory)} available on partition {partition}', 'error'))
+        if needs['tmp'] > disk:
+            available = f'the {format_size(disk)} of local disk' if disk else 'any local disk'
+            problems.append(('tmp', f'{format_size(needs["tmp"])} of local scratch exceeds {available} on partition {partition}',
+                             'error'))
+        if needs['gpus'] and not gpus_per_node:
+            # A warning, not an error: sbatch accepts the request as written
+            problems.append(('gpus', f'Partition {partition} is a CPU partition without GPUs', 'warning'))
+        elif needs['gpus'] and needs['gpus'] > gpus_per_node * needs['nodes']:
+            problems.append(('gpus', f'{needs["gpus"]} GPUs requested but partition {partition} has '
+                                     f'{gpus_per_node * needs["nodes"]} on {needs["nodes"]} node(s)', 'error'))
+        return problems
+
+    def _check_fit(self, spec, partition, errors, tables):
+        """Check memory, local disk and GPU requests against the partition's nodes"""
+        needs = self.requirements(spec)
+        problems = self._fits(partition, needs, tables)
+        if not problems:
+            return
+        suggestion = self.suggest_partition(spec, needs, tables)
+        hint = f'; smallest partition that fits: {suggestion}' if suggestion else ''
+        for field, message, severity in problems:
+            errors.append(_error(self.field_names[field], 'capacity', message + hint, severity, suggestion))
+
+    def suggest_partition(self, spec, needs=None, tables=None):
+        """Return the smallest partition whose nodes fit the spec, or None
+
+        Partitions are ranked by node memory, then local disk, then walltime
+        limit, so a job only moves to medmem, bigmem or nvme when it has to.
+        Partitions marked ``auto_select: false`` (debug, hbw) are never suggested.
+        """
+        if needs is None:
+            needs = self.requirements(spec)
+        tables = tables or self._tables
+        walltime = spec.get(self.field_names['time'])
+        minutes = parse_walltime(walltime) if walltime and WALLTIME_RE.match(str(walltime)) else 0
+
+        candidates = []
+        for index, (name, info) in enumerate(tables.partitions.items()):
+            if not info.get('auto_select', True):
+                continue
+            min_nodes, max_nodes, max_minutes = tables.limits[name]
+            memory, disk, gpus_per_node = tables.capacity[name]
+            if bool(needs['gpus']) != bool(gpus_per_node):
+                continue
+            if needs['nodes'] < min_nodes or (max_nodes is not None and needs['nodes'] > max_nodes):
+                continue
+            if max_minutes is not None and minutes > max_minutes:
+                continue
+            if self._fits(name, needs, tables):
+                continue
+            candidates.append(((memory or 0, disk, max_minutes or 0, index), name))
+        return min(candidates)[1] if candidates else None
+
+    def fit_report(self, spec):
+        """Normalised sizes of a spec and how they fit its partition"""
+        needs = self.requirements(spec)
+        tables = self._tables
+        partition = spec.get(self.field_names['partition']) or None
+        problems = self._fits(partition, needs, tables) if partition in tables.capacity else []
+        return {
+            'memory_bytes': needs['memory'],
+            'tmp_bytes': needs['tmp'],
+            'gpus': needs['gpus'],
+            'nodes': needs['nodes'],
+            'partition': partition,
+            'fits': partition is not None and partition in tables.capacity and not problems,
+            'problems': [message for _, message, _ in problems],
+            'suggested_partition': self.suggest_partition(spec, needs, tables),
+        }
+
+    def auto_partition(self, spec):
+        """Set the spec's partition to the smallest one that fits, if it has none or does not fit
+
+        Returns the partition that was chosen, or None if the spec was left alone
+        (already fits, nothing fits, or its sizes do not parse).
+        """
+        key = self.field_names['partition']
+        try:
+            needs = self.requirements(spec)
+        except (TypeError, ValueError):
+            return None
+        current = spec.get(key)
+        tables = self._tables
+        if current in tables.capacity and not self._fits(current, needs, tables):
+            return None
+        suggestion = self.suggest_partition(spec, needs, tables)
+        if suggestion:
+            spec[key] = suggestion
+        return suggestion
+
+
+def has_errors(errors):
+    """True if any entry is an error rather than a warning"""
+    return any(e['severity'] == 'error' for e in errors)
+
+
+def error_messages(errors):
+    """Plain messages for the entries that are errors rather than warnings"""
+    return [e['message'] for e in errors if e['severity'] == 'error']
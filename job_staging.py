@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Node-Local Staging
+Copy declared inputs onto node-local NVMe before the application starts, run
+it there, and copy declared outputs back when the script exits, so I/O heavy
+jobs stop hammering Lustre.
+"""
+
+import glob
+import os
+
+from job_units import UNIT_FACTORS, parse_size
+
+# Node-local working directory; $TMPDIR is the job's NVMe scratch on Kestrel
+STAGE_DIR = '${TMPDIR:-/tmp/scratch/$SLURM_JOB_ID}/stage'
+
+# --tmp is sized for the inputs plus the same again for outputs and scratch
+STAGING_HEADROOM = 2
+
+
+def as_list(value):
+    """Staging paths from a CLI list or a newline/comma separated web field"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace(',', '\n').split('\n')
+    return [path.strip() for path in value if path and path.strip()]
+
+
+def input_bytes(patterns, base_dir='.'):
+    """Total size of the files matching the input patterns, and the patterns that match nothing"""
+    total = 0
+    missing = []
+    for pattern in patterns:
+        matches = glob.glob(os.path.join(base_dir, os.path.expandvars(pattern)))
+        if not matches:
+            missing.append(pattern)
+        for path in matches:
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+            else:
+                total += os.path.getsize(path)
+    return total, missing
+
+
+def staging_tmp_size(patterns, current=None, base_dir='.'):
+    """Local scratch (--tmp) needed for the staged inputs, never less than ``current``
+
+    Returns (size, missing): the size as a whole-gigabyte string, or
+    ``current`` if it is already large enough or nothing could be measured.
+    """
+    total, missing = input_bytes(patterns, base_dir)
+    needed = total * STAGING_HEADROOM
+    if not needed or (current and parse_size(current) >= needed):
+        return current, missing
+    return f'{-(-needed // UNIT_FACTORS["G"])}G', missing
+
+
+def staging_lines(inputs, outputs, nodes=1, on_exit=()):
+    """Shell lines that stage inputs in on every node, cd there and stage outputs out on exit
+
+    Multi-node jobs broadcast files with sbcast and copy directories with one
+    cp per node; stage-out copies from the batch node and runs from an EXIT
+    trap, so results come back when the application fails or the job is killed.
+    ``on_exit`` names functions an earlier EXIT trap runs (e.g. mps_stop); the
+    stage-out trap replaces that trap, so it runs them too.
+    """
+    inputs, outputs = as_list(inputs), as_list(outputs)
+    every_node = 'srun --nodes="$SLURM_JOB_NUM_NODES" --ntasks="$SLURM_JOB_NUM_NODES" --ntasks-per-node=1'
+    lines = [
+        '# Node-local staging',
+        'SUBMIT_DIR=$PWD',
+        f'STAGE_DIR={STAGE_DIR}',
+    ]
+
+    if outputs:
+        lines.extend([
+            'stage_out() {',
+            '    echo "Staging out results to $SUBMIT_DIR at $(date)"',
+            '    cd "$STAGE_DIR" || return',
+            f'    for path in {" ".join(outputs)}; do',
+            '        [ -e "$path" ] && cp -rp "$path" "$SUBMIT_DIR"/',
+            '    done',
+            '}',
+            '# Runs however the script ends: success, failure, scancel or the time limit',
+            f"trap '{'; '.join(['stage_out', *on_exit])}' EXIT" if on_exit else 'trap stage_out EXIT',
+        ])
+
+    if nodes > 1:
+        lines.append(f'{every_node} mkdir -p "$STAGE_DIR"')
+    else:
+        lines.append('mkdir -p "$STAGE_DIR"')
+
+    if inputs:
+        lines.append('echo "Staging in inputs to $STAGE_DIR at $(date)"')
+        lines.append(f'for path in {" ".join(inputs)}; do')
+        lines.append('    [ -e "$path" ] || { echo "Stage-in input not found: $path"; exit 1; }')
+        if nodes > 1:
+            lines.extend([
+                '    if [ -d "$path" ]; then',
+                f'        {every_node} cp -rp "$path" "$STAGE_DIR"/',
+                '    else',
+                '        sbcast --force "$path" "$STAGE_DIR/$(basename "$path")"',
+                '    fi',
+            ])
+        else:
+            lines.append('    cp -rp "$path" "$STAGE_DIR"/')
+        lines.append('done')
+
+    lines.append('cd "$STAGE_DIR"')
+    return lines
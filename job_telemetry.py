@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - In-Job Telemetry
+Instrument a generated script so every job reports where its time went: each
+command of the job is timed as a step, sstat samples every running Slurm step
+in the background (and nvidia-smi the GPUs), and at the end a JSON summary of
+step timings, CPU efficiency, peak memory against the request and GPU
+utilisation is written next to the job's output file.
+"""
+
+import json
+import os
+import re
+
+from job_lint import HEREDOC_RE, Statement, split_words
+
+# Seconds between sstat/nvidia-smi samples
+DEFAULT_INTERVAL = 30
+
+# Commands that only change the shell's state; timing them is noise
+SETUP_COMMANDS = frozenset(['export', 'cd', 'source', '.', 'set', 'unset', 'module', 'ml', 'ulimit', 'umask',
+                            'alias', 'trap', 'shopt'])
+
+# Longest command text kept as a step label
+LABEL_LENGTH = 200
+
+_OPENING_WORDS = frozenset(['for', 'while', 'until', 'select', 'if', 'case', '{', '('])
+_CLOSING_WORDS = frozenset(['done', 'fi', 'esac', '}', ')'])
+_SEPARATORS = frozenset([';', '&', '&&', '||', '|', ';;', '|&'])
+
+# Slurm output filename patterns -> shell variables
+_FILENAME_PATTERNS = {
+    'j': '${SLURM_JOB_ID}',
+    'A': '${SLURM_ARRAY_JOB_ID}',
+    'a': '${SLURM_ARRAY_TASK_ID}',
+    'x': '${SLURM_JOB_NAME}',
+    'u': '${USER}',
+    'N': '${SLURMD_NODENAME}',
+    '%': '%',
+}
+
+# Runs at the end of the job: argv is the telemetry directory, the summary
+# path and the job start time; LABELS is filled in per script
+SUMMARY_SCRIPT = '''import json, os, re, sys, time
+
+directory, path, started = sys.argv[1], sys.argv[2], float(sys.argv[3])
+LABELS = {labels}
+UNITS = {{'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}}
+
+
+def rows(name, columns, separator='|'):
+    try:
+        with open(os.path.join(directory, name)) as f:
+            lines = [line.rstrip('\\n').split(separator) for line in f if line.strip()]
+    except OSError:
+        return []
+    return [row for row in lines if len(row) == columns]
+
+
+def epoch(text):
+    try:
+        return float(text)
+    except ValueError:  # Unknown/None for steps that never started
+        return 0.0
+
+
+def seconds(text):
+    days, _, clock = text.rpartition('-')
+    total = 0.0
+    for part in clock.split(':'):
+        total = total * 60 + float(part or 0)
+    return total + int(days or 0) * 86400
+
+
+def size(text):
+    text = text.strip()
+    if not text:
+        return 0
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(float(text))
+
+
+def cpus(text):
+    total = 0
+    for count, repeat in re.findall(r'(\\d+)(?:\\(x(\\d+)\\))?', text):
+        total += int(count) * int(repeat or 1)
+    return total
+
+
+now = time.time()
+elapsed = now - started
+slurm_steps = {{}}
+for job_id, start, end, total_cpu, ntasks, nnodes, max_rss, state in rows('sacct', 8):
+    step = job_id.partition('.')[2]
+    if step.isdigit():
+        slurm_steps[step] = {{'start': epoch(start), 'cpu_seconds': seconds(total_cpu or '0'),
+                             'ntasks': int(ntasks or 1), 'nnodes': int(nnodes or 1),
+                             'max_rss_bytes': size(max_rss), 'state': state, 'samples': []}}
+for sample_time, job_id, ave_cpu, max_rss, ntasks in rows('sstat', 5):
+    step = slurm_steps.get(job_id.partition('.')[2])
+    if step is not None:
+        step['samples'].append([int(sample_time), seconds(ave_cpu or '0'), size(max_rss)])
+        step['max_rss_bytes'] = max(step['max_rss_bytes'], size(max_rss))
+
+steps = []
+for number, start, end, status in rows('steps', 4, '\\t'):
+    start, end = float(start), float(end)
+    step = {{'step': int(number), 'command': LABELS[int(number) - 1], 'start': round(start, 3),
+            'elapsed_seconds': round(end - start, 3), 'exit_code': int(status), 'slurm_steps': []}}
+    for step_id, slurm_step in sorted(slurm_steps.items(), key=lambda item: int(item[0])):
+        if start - 1 <= slurm_step['start'] <= end + 1:
+            step['slurm_steps'].append(dict(slurm_step, id=step_id))
+    steps.append(step)
+
+nodes = int(os.environ.get('SLURM_JOB_NUM_NODES', 1))
+allocated_cpus = cpus(os.environ.get('SLURM_JOB_CPUS_PER_NODE', '')) or int(os.environ.get('SLURM_CPUS_ON_NODE', 1)) * nodes
+times = rows('times', 2, ' ')
+shell_cpu = sum(seconds(value.rstrip('s').replace('m', ':')) for value in times[1]) if len(times) > 1 else 0.0
+cpu_seconds = shell_cpu + sum(step['cpu_seconds'] for step in slurm_steps.values())
+
+if os.environ.get('SLURM_MEM_PER_NODE'):
+    memory_requested = int(os.environ['SLURM_MEM_PER_NODE']) * 2 ** 20
+elif os.environ.get('SLURM_MEM_PER_CPU'):
+    memory_requested = int(os.environ['SLURM_MEM_PER_CPU']) * 2 ** 20 * int(os.environ.get('SLURM_CPUS_ON_NODE', 1))
+else:
+    memory_requested = None
+# MaxRSS is per task; a node holds up to ntasks/nnodes of them
+peak_node = max([step['max_rss_bytes'] * -(-step['ntasks'] // step['nnodes']) for step in slurm_steps.values()] or [0])
+
+summary = {{
+    'job_id': os.environ.get('SLURM_JOB_ID'),
+    'job_name': os.environ.get('SLURM_JOB_NAME'),
+    'restart_count': int(os.environ.get('SLURM_RESTART_COUNT', 0)),
+    'nodes': nodes,
+    'start': round(started, 3),
+    'end': round(now, 3),
+    'elapsed_seconds': round(elapsed, 3),
+    'cpu': {{
+        'allocated': allocated_cpus,
+        'used_seconds': round(cpu_seconds, 3),
+        'efficiency': round(cpu_seconds / (elapsed * allocated_cpus), 4) if elapsed > 0 and allocated_cpus else None,
+    }},
+    'memory': {{
+        'requested_per_node_bytes': memory_requested,
+        'max_rss_per_task_bytes': max([step['max_rss_bytes'] for step in slurm_steps.values()] or [0]),
+        'peak_per_node_bytes': peak_node,
+        'efficiency': round(peak_node / memory_requested, 4) if memory_requested else None,
+    }},
+    'steps': steps,
+}}
+
+gpu_rows = rows('gpu', 4, ',')
+if gpu_rows:
+    by_gpu = {{}}
+    for index, utilization, memory_used, memory_total in gpu_rows:
+        gpu = by_gpu.setdefault(index.strip(), {{'utilization': [], 'memory_used': 0, 'memory_total': 0}})
+        if utilization.strip().isdigit():
+            gpu['utilization'].append(int(utilization))
+        gpu['memory_used'] = max(gpu['memory_used'], int(float(memory_used or 0)) * 2 ** 20)
+        gpu['memory_total'] = int(float(memory_total or 0)) * 2 ** 20
+    summary['gpu'] = [
+        {{'index': int(index), 'samples': len(gpu['utilization']),
+         'mean_utilization_percent': round(sum(gpu['utilization']) / len(gpu['utilization']), 1) if gpu['utilization'] else None,
+         'max_memory_used_bytes': gpu['memory_used'], 'memory_total_bytes': gpu['memory_total']}}
+        for index, gpu in sorted(by_gpu.items(), key=lambda item: int(item[0]))
+    ]
+
+with open(path + '.tmp', 'w') as f:
+    json.dump(summary, f)
+os.replace(path + '.tmp', path)
+'''
+
+
+def summary_path(output=None):
+    """Shell word for the JSON summary next to the job's output file
+
+    ``slurm-%j.out`` becomes ``slurm-$SLURM_JOB_ID.telemetry.json`` in the
+    submit directory; Slurm filename patterns turn into the same variables.
+    """
+    stem, extension = os.path.splitext(output or 'slurm-%j.out')
+    if '%' in extension or '/' in extension:
+        stem = output
+    parts = []
+    index = 0
+    while index < len(stem):
+        char = stem[index]
+        if char == '%' and index + 1 < len(stem):
+            parts.append(_FILENAME_PATTERNS.get(stem[index + 1], ''))
+            index += 2
+            continue
+        parts.append('\\' + char if char in '"\\`$' else char)
+        index += 1
+    name = ''.join(parts) + '.telemetry.json'
+    if not stem.startswith('/'):
+        name = '${SLURM_SUBMIT_DIR:-$PWD}/' + name
+    return f'"{name}"'
+
+
+def telemetry_setup(output=None, interval=None, gpus=False):
+    """Shell lines that define the step timers and start the background samplers"""
+    interval = int(interval or DEFAULT_INTERVAL)
+    lines = [
+        f'# Telemetry: step timings, sstat samples every {interval} s and an efficiency summary',
+        'TELEMETRY_DIR=$(mktemp -d "${TMPDIR:-/tmp}/telemetry.XXXXXX")',
+        f'TELEMETRY_SUMMARY={summary_path(output)}',
+        'telemetry_begin() {',
+        '    TELEMETRY_STEP=$1',
+        '    TELEMETRY_STEP_START=$(date +%s.%N)',
+        '}',
+        'telemetry_end() {',
+        '    printf \'%s\\t%s\\t%s\\t%s\\n\' "$TELEMETRY_STEP" "$TELEMETRY_STEP_START" "$(date +%s.%N)" "$1" '
+        '>> "$TELEMETRY_DIR/steps"',
+        '    return "$1"',
+        '}',
+        'while true; do',
+        '    sstat --allsteps --noheader --parsable2 --format=JobID,AveCPU,MaxRSS,NTasks -j "$SLURM_JOB_ID" '
+        '2>/dev/null | sed "s/^/$(date +%s)|/" >> "$TELEMETRY_DIR/sstat"',
+        f'    sleep {interval}',
+        'done &',
+        'TELEMETRY_PIDS=$!',
+    ]
+    if gpus:
+        lines.extend([
+            'nvidia-smi --query-gpu=index,utilization.gpu,memory.used,memory.total --format=csv,noheader,nounits '
+            f'-l {interval} > "$TELEMETRY_DIR/gpu" 2>/dev/null &',
+            'TELEMETRY_PIDS="$TELEMETRY_PIDS $!"',
+        ])
+    lines.append('TELEMETRY_START=$(date +%s.%N)')
+    return lines
+
+
+def _depth_change(words):
+    """How far a line opens (+) or closes (-) compound commands"""
+    change = 0
+    at_start = True
+    index = 0
+    while index < len(words):
+        word = words[index]
+        if words[index:index + 2] == ['(', ')']:
+            index += 2  # function definition: name() { ... }
+            at_start = True
+            continue
+        if at_start and word in _OPENING_WORDS:
+            change += 1
+        elif at_start and word in _CLOSING_WORDS:
+            change -= 1
+        at_start = word in _SEPARATORS or word in ('do', 'then', 'else', 'elif', '{', '(', '!')
+        index += 1
+    return change
+
+
+def instrument_steps(lines):
+    """Time every top-level command line of the execution block
+
+    Returns (lines, labels): each command is bracketed by telemetry_begin and
+    telemetry_end, which keeps its exit status. Compound commands spanning
+    lines, heredocs, continuation lines, background commands and shell setup
+    (export, cd, module) are left as they are.
+    """
+    instrumented = []
+    labels = []
+    depth = 0
+    heredoc = None
+    continued = False
+    for line in lines:
+        stripped = line.strip()
+        if heredoc:
+            instrumented.append(line)
+            if stripped == heredoc:
+                heredoc = None
+            continue
+        if continued or not stripped or stripped.startswith('#'):
+            continued = continued and stripped.endswith('\\')
+            instrumented.append(line)
+            continue
+
+        words = split_words(stripped.rstrip('\\'))
+        change = _depth_change(words)
+        match = HEREDOC_RE.search(stripped)
+        if match:
+            heredoc = match.group(1)
+        top_level = depth == 0 and change == 0
+        depth = max(depth + change, 0)
+        continued = stripped.endswith('\\')
+        command = Statement(0, words).command
+        if (not top_level or continued or match or words[-1:] == ['&'] or command is None
+                or command in SETUP_COMMANDS or command.startswith('telemetry_')):
+            instrumented.append(line)
+            continue
+
+        labels.append(stripped if len(stripped) <= LABEL_LENGTH else stripped[:LABEL_LENGTH - 3] + '...')
+        instrumented.extend([f'telemetry_begin {len(labels)}', line, 'telemetry_end $?'])
+    return instrumented, labels
+
+
+def telemetry_summary(labels):
+    """Shell lines that stop the samplers and write the JSON efficiency summary"""
+    return [
+        '# Telemetry summary',
+        'kill $TELEMETRY_PIDS 2>/dev/null',
+        'times > "$TELEMETRY_DIR/times"',
+        'SLURM_TIME_FORMAT=%s sacct -j "$SLURM_JOB_ID" --noheader --parsable2 '
+        '--format=JobID,Start,End,TotalCPU,NTasks,NNodes,MaxRSS,State > "$TELEMETRY_DIR/sacct" 2>/dev/null',
+        'if command -v python3 > /dev/null; then',
+        '    python3 - "$TELEMETRY_DIR" "$TELEMETRY_SUMMARY" "$TELEMETRY_START" << \'TELEMETRY_EOF\'',
+        *SUMMARY_SCRIPT.format(labels=json.dumps(labels)).splitlines(),
+        'TELEMETRY_EOF',
+        '    echo "Telemetry summary: $TELEMETRY_SUMMARY"',
+        'else',
+        '    echo "python3 not found; no telemetry summary written"',
+        'fi',
+        'rm -rf "$TELEMETRY_DIR"',
+    ]
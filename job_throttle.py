@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Request Throttling
+Keep bursts of live-preview requests from piling up in the web workers:
+per-client token-bucket rate limiting, coalescing of identical in-flight
+specs into one render, and dropping previews a newer one has superseded.
+All state is in-memory and per worker process.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+# Idle clients are forgotten after this many seconds
+CLIENT_TTL = 600
+
+
+class RateLimiter:
+    """Token bucket per client: ``rate`` requests per second, bursts of up to ``burst``"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def allow(self, client):
+        """Take a token for the client; returns (allowed, seconds until the next token)"""
+        if not self.enabled:
+            return True, 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[client] = (tokens, now)
+            if now - self._last_prune > CLIENT_TTL:
+                self._prune(now)
+        return allowed, 0.0 if allowed else (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        # A bucket idle long enough to refill completely carries no state
+        full = self.burst / self.rate
+        self._buckets = {client: (tokens, last) for client, (tokens, last) in self._buckets.items()
+                         if now - last < full}
+        self._last_prune = now
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """Run identical concurrent requests once and hand every caller the same result"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(spec):
+        """Canonical key for a JSON job spec"""
+        text = json.dumps(spec, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def run(self, key, function):
+        """Return ``function()``, or the result of the identical call already in flight
+
+        Returns (result, shared): ``shared`` is True when another request did the work.
+        Exceptions are raised in every caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = function()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class PreviewTracker:
+    """Latest preview sequence number per client page, to drop superseded previews"""
+
+    def __init__(self):
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def start(self, client, seq):
+        """Record a preview; returns False if a newer one from the same page was already seen"""
+        now = time.monotonic()
+        with self._lock:
+            latest, _ = self._latest.get(client, (-1, now))
+            if seq < latest:
+                return False
+            self._latest[client] = (seq, now)
+            if now - self._last_prune > CLIENT_TTL:
+                self._latest = {key: value for key, value in self._latest.items() if now - value[1] < CLIENT_TTL}
+                self._last_prune = now
+        return True
+
+    def is_stale(self, client, seq):
+        """True once a newer preview from the same page has arrived"""
+        with self._lock:
+            latest, _ = self._latest.get(client, (-1, 0))
+        return seq < latest
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Size Units
+Normalise Slurm memory and storage size strings (--mem, --mem-per-cpu, --tmp)
+to bytes and back.
+"""
+
+import re
+from functools import lru_cache
+
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(?:([KMGTP])(?:i?B)?|(B))?\s*$', re.IGNORECASE)
+
+# Slurm uses binary multiples for K/M/G/T
+UNIT_FACTORS = {
+    'K': 1024,
+    'M': 1024 ** 2,
+    'G': 1024 ** 3,
+    'T': 1024 ** 4,
+    'P': 1024 ** 5,
+}
+
+
+@lru_cache(maxsize=4096)
+def parse_size(value, default_unit='M'):
+    """Convert a Slurm size string (e.g. 50G, 1.5TB, 2048) to bytes
+
+    Numbers without a suffix are in ``default_unit``, megabytes for both
+    --mem and --tmp. Raises ValueError for anything Slurm would not accept.
+    """
+    match = SIZE_RE.match(str(value))
+    if not match:
+        raise ValueError(f'Invalid size: {value}')
+    number, unit, plain_bytes = match.groups()
+    if plain_bytes:
+        factor = 1
+    else:
+        factor = UNIT_FACTORS[(unit or default_unit).upper()]
+    return int(float(number) * factor)
+
+
+def format_size(num_bytes):
+    """Format bytes as the shortest exact-ish Slurm size string (e.g. 240G, 1.5T)"""
+    for unit in ('P', 'T', 'G', 'M', 'K'):
+        factor = UNIT_FACTORS[unit]
+        if num_bytes >= factor:
+            value = num_bytes / factor
+            return f'{value:.0f}{unit}' if value == int(value) else f'{value:.1f}{unit}'
+    return f'{num_bytes}B'
+
+
+
+def slurm_size(value, default_unit='M'):
+    """Return a size in a form sbatch accepts
+
+    Whole numbers with an optional suffix are returned unchanged; fractional
+    sizes such as 1.5T, which sbatch rejects, become whole megabytes or gigabytes.
+    """
+    text = str(value).strip()
+    match = SIZE_RE.match(text)
+    if not match or '.' not in match.group(1):
+        return text
+    num_bytes = parse_size(text, default_unit)
+    if num_bytes % UNIT_FACTORS['G'] == 0:
+        return f'{num_bytes // UNIT_FACTORS["G"]}G'
+    return f'{-(-num_bytes // UNIT_FACTORS["M"])}M'
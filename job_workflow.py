@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Workflows
+Compile a DAG of job specs into stage scripts plus a submit driver that chains
+them with Slurm dependencies. Sibling stages that fit together are merged into
+heterogeneous jobs so they wait in the queue once instead of several times.
+
+A workflow file (JSON, YAML or TOML) looks like:
+
+    name: md_campaign
+    defaults: {account: csc000, template: lammps}
+    stages:
+      prep:  {time: "00:30:00", commands: ["python prep.py"]}
+      solve: {after: [prep], array: "1-100", nodes: 2, ntasks: 208}
+      post:  {after: [solve], commands: ["python collect.py"]}
+"""
+
+import re
+
+from job_fingerprint import split_directive
+from job_schema import parse_walltime
+
+DEPENDENCY_TYPES = ('afterok', 'afterany', 'afternotok', 'aftercorr')
+
+# Keys of a stage that describe the workflow rather than the job itself
+STAGE_KEYS = frozenset(['after', 'dependency', 'singleton', 'hetjob'])
+
+# Directives only the first component of a heterogeneous job may carry
+HETJOB_LEADER_DIRECTIVES = frozenset(['--job-name', '--output', '--error', '--mail-user', '--mail-type'])
+
+
+class WorkflowError(ValueError):
+    """Raised when a workflow description is invalid"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__('; '.join(self.errors))
+
+
+class Stage:
+    """One node of the workflow DAG"""
+
+    def __init__(self, name, spec, after, dependency, singleton, hetjob):
+        self.name = name
+        self.spec = spec
+        self.after = after
+        self.dependency = dependency
+        self.singleton = singleton
+        self.hetjob = hetjob
+
+    @property
+    def variable(self):
+        return 'job_' + re.sub(r'\W', '_', self.name)
+
+
+def parse_stages(document, base_spec):
+    """Build Stage objects from a workflow document, merged over base_spec and its defaults"""
+    errors = []
+    if not isinstance(document, dict) or not isinstance(document.get('stages'), dict) or not document['stages']:
+        raise WorkflowError(['Workflow must define a non-empty "stages" mapping'])
+
+    defaults = {key.replace('-', '_'): value for key, value in (document.get('defaults') or {}).items()}
+    stages = {}
+    for name, raw in document['stages'].items():
+        if not isinstance(raw, dict):
+            errors.append(f'Stage {name}: must be a mapping')
+            continue
+        raw = {key.replace('-', '_'): value for key, value in raw.items()}
+        after = raw.get('after') or []
+        if isinstance(after, str):
+            after = [after]
+        dependency = raw.get('dependency', 'afterok')
+        if dependency not in DEPENDENCY_TYPES:
+            errors.append(f'Stage {name}: dependency must be one of {", ".join(DEPENDENCY_TYPES)}')
+
+        spec = dict(base_spec)
+        spec.update(defaults)
+        spec.update({key: value for key, value in raw.items() if key not in STAGE_KEYS})
+        spec['job_name'] = raw.get('job_name') or name
+        for key in ('commands', 'modules'):
+            if isinstance(spec.get(key), str):
+                spec[key] = [spec[key]]
+
+        stages[name] = Stage(name, spec, list(after), dependency,
+                             bool(raw.get('singleton')), raw.get('hetjob', True))
+
+    for stage in stages.values():
+        for parent in stage.after:
+            if parent not in stages:
+                errors.append(f'Stage {stage.name}: unknown parent stage "{parent}"')
+    if errors:
+        raise WorkflowError(errors)
+    return stages
+
+
+def topological_order(stages):
+    """Order stage names so every stage follows its parents; raises on cycles"""
+    order = []
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'active':
+            raise WorkflowError([f'Dependency cycle: {" -> ".join(path + [name])}'])
+        state[name] = 'active'
+        for parent in stages[name].after:
+            visit(parent, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in stages:
+        visit(name, [])
+    return order
+
+
+def hetjob_groups(stages, order, parallel=None):
+    """Group sibling stages that can share one heterogeneous job allocation
+
+    Stages fit together when they have the same parents and dependency type,
+    the same account, partition and QoS and the same walltime, and are not
+    arrays, singletons or checkpoint/requeue jobs. The batch script runs on the first component, so a
+    stage only joins a group as a later component if ``parallel(spec)`` says
+    all of its work is launched with srun. Each group is a list of stage names
+    in DAG order.
+    """
+    groups = []
+    by_key = {}
+    for name in order:
+        stage = stages[name]
+        spec = stage.spec
+        key = None
+        if stage.hetjob and not spec.get('array') and not stage.singleton and not spec.get('resilient'):
+            try:
+                walltime = parse_walltime(spec.get('time'))
+            except (TypeError, ValueError):
+                walltime = None
+            if walltime is not None:
+                key = (tuple(sorted(stage.after)), stage.dependency, spec.get('account'),
+                       spec.get('partition'), spec.get('qos'), walltime)
+        if key is not None and key in by_key:
+            if parallel is None or parallel(spec):
+                by_key[key].append(name)
+                continue
+            key = None
+        group = [name]
+        groups.append(group)
+        if key is not None:
+            by_key[key] = group
+    return groups
+
+
+def merge_hetjob(names, scripts):
+    """Combine rendered stage scripts into one heterogeneous job script"""
+    header = ['#!/bin/bash', '', f'# NREL HPC Heterogeneous Job - stages: {", ".join(names)}', '']
+    bodies = []
+    for group, name in enumerate(names):
+        directives, body = [], []
+        in_body = False
+        for line in scripts[name].splitlines():
+            directive = split_directive(line)
+            if directive and not in_body:
+                if group == 0 or directive[0] not in HETJOB_LEADER_DIRECTIVES:
+                    directives.append(line)
+                continue
+            if directives:
+                in_body = True
+            if in_body:
+                stripped = line.lstrip()
+                if stripped.startswith('srun '):
+                    line = line.replace('srun ', f'srun --het-group={group} ', 1)
+                body.append(line)
+        if group:
+            header.append('#SBATCH hetjob')
+        header.extend(directives)
+        bodies.append((group, name, body))
+
+    lines = header + ['', 'pids=()']
+    for group, name, body in bodies:
+        lines.append(f'# --- Stage {name} (het group {group}) ---')
+        lines.append('(')
+        # Not indented: here-documents in the stage body need their terminator in column 0
+        lines.extend(body)
+        lines.append(') &')
+        lines.append('pids+=($!)')
+        lines.append('')
+    lines.extend([
+        '# Fail the whole job if any component failed, so afterok dependencies hold',
+        'status=0',
+        'for pid in "${pids[@]}"; do',
+        '    wait "$pid" || status=$?',
+        'done',
+        'exit $status',
+    ])
+    return '\n'.join(lines)
+
+
+def compile_workflow(document, base_spec, render, validate, parallel=None, hetjobs=True):
+    """Render every stage and the submit driver of a workflow
+
+    ``render(spec)`` returns a script, ``validate(spec)`` returns a list of
+    structured errors (see job_schema) and ``parallel(spec)`` tells whether a
+    stage can be a later heterogeneous job component (see hetjob_groups).
+    Returns (name, {filename: script}).
+    """
+    name = re.sub(r'[^\w.-]', '_', str(document.get('name') or 'workflow'))
+    stages = parse_stages(document, base_spec)
+    order = topological_order(stages)
+
+    errors = []
+    for stage_name in order:
+        for error in validate(stages[stage_name].spec):
+            if error['severity'] == 'error':
+                errors.append(f'Stage {stage_name}: --{error["field"].replace("_", "-")}: {error["message"]}')
+    if errors:
+        raise WorkflowError(errors)
+
+    groups = hetjob_groups(stages, order, parallel) if hetjobs else [[stage_name] for stage_name in order]
+    scripts = {stage_name: render(stages[stage_name].spec) for stage_name in order}
+
+    files = {}
+    unit_of = {}
+    units = []
+    for group in groups:
+        if len(group) == 1:
+            filename = f'{group[0]}.sh'
+            files[filename] = scripts[group[0]]
+        else:
+            filename = f'{"+".join(group)}.sh'
+            files[filename] = merge_hetjob(group, scripts)
+        leader = stages[group[0]]
+        units.append((leader, group, filename))
+        for stage_name in group:
+            unit_of[stage_name] = leader.variable
+
+    files[f'submit_{name}.sh'] = _driver(name, units, unit_of)
+    return name, files
+
+
+def _driver(name, units, unit_of):
+    """Bash driver that submits every unit in order with its dependencies"""
+    lines = [
+        '#!/bin/bash',
+        f'# Submit driver for workflow {name}',
+        '# Generated by generate_job.py --workflow; submits every stage with sbatch',
+        '# and chains them with Slurm job dependencies.',
+        '',
+        'set -euo pipefail',
+        'cd "$(dirname "$0")"',
+        '',
+        'submit() {',
+        '    local jobid',
+        '    jobid=$(sbatch --parsable "$@")',
+        '    echo "${jobid%%;*}"',
+        '}',
+        '',
+    ]
+    for leader, group, filename in units:
+        # Stages of one heterogeneous job share their parents, so the leader's suffice
+        parents = []
+        for parent in leader.after:
+            if unit_of[parent] not in parents:
+                parents.append(unit_of[parent])
+        options = []
+        conditions = []
+        if parents:
+            conditions.append(leader.dependency + ':' + ':'.join(f'${{{var}}}' for var in parents))
+        if leader.singleton:
+            conditions.append('singleton')
+        if conditions:
+            options.append(f'--dependency={",".join(conditions)}')
+            options.append('--kill-on-invalid-dep=yes')
+        command = ' '.join(['submit'] + options + [f'"{filename}"'])
+        lines.append(f'{leader.variable}=$({command})')
+        lines.append(f'echo "{" + ".join(group)}: ${{{leader.variable}}}"')
+    lines.append('')
+    return '\n'.join(lines)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+NREL HPC Job Script Generator - Load Test
+Replay a realistic mix of /generate, /download, /templates/<name> and
+/examples requests against the web application and report throughput,
+latency percentiles and error rates as JSON that can be compared across commits.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+DEFAULT_MIX = 'generate=60,download=15,template=15,examples=10'
+
+TEMPLATES = ('general', 'gaussian', 'lammps', 'ansys', 'comsol')
+# Walltimes people ask for on each partition, all within its limit
+WALLTIMES = {
+    'debug': ('00:15:00', '00:30:00', '01:00:00'),
+    'short': ('00:30:00', '01:00:00', '04:00:00'),
+    'standard': ('01:00:00', '04:00:00', '12:00:00', '1-00:00:00', '2-00:00:00'),
+    'nvme': ('01:00:00', '04:00:00', '12:00:00'),
+}
+# Typical form mistakes; the server should answer them with 400, not fail
+MISTAKES = (('walltime', ''), ('walltime', 'abc'), ('nodes', 'abc'), ('nodes', '-1'), ('account', ''))
+COMMANDS = {
+    'general': 'python analysis.py\n./a.out',
+    'gaussian': 'g16_nrel < benzene.gjf > benzene.log',
+    'lammps': 'lmp -in in.lj',
+    'ansys': '',
+    'comsol': '',
+}
+
+
+def make_spec(rng, invalid_rate):
+    """A form submission like the ones the live preview sends, and whether it is valid"""
+    template = rng.choice(TEMPLATES)
+    nodes = rng.choice((1, 1, 1, 2, 4))
+    partition = rng.choice(tuple(WALLTIMES)) if nodes <= 2 else 'standard'
+    spec = {
+        'account': rng.choice(('csc000', 'hpcapps', 'wind01')),
+        'walltime': rng.choice(WALLTIMES[partition]),
+        'job_name': f'{template}_{rng.randint(1, 500)}',
+        'application_template': template,
+        'partition': partition,
+        'nodes': str(nodes),
+        'commands': COMMANDS[template],
+    }
+    if rng.random() < 0.5:
+        spec['ntasks_per_node'] = str(rng.choice((26, 52, 104)))
+        spec['ntasks'] = str(int(spec['ntasks_per_node']) * nodes)
+    if rng.random() < 0.3:
+        spec['memory'] = rng.choice(('50G', '120G', '200G'))
+    if rng.random() < 0.2:
+        spec['email'] = 'user@nrel.gov'
+        spec['mail_end'] = True
+    if rng.random() < invalid_rate:
+        field, value = rng.choice(MISTAKES)
+        spec[field] = value
+        return spec, False
+    return spec, True
+
+
+def parse_mix(text):
+    """Turn "generate=60,download=15,..." into [(kind, weight), ...]"""
+    mix = []
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in ('generate', 'download', 'template', 'examples'):
+            raise ValueError(f'Unknown request kind "{kind}" in --mix')
+        mix.append((kind, float(weight or 1)))
+    return mix
+
+
+def build_requests(count, mix, seed, invalid_rate):
+    """Deterministic request schedule: (kind, method, path, body, expected_status)"""
+    rng = random.Random(seed)
+    kinds = [kind for kind, _ in mix]
+    weights = [weight for _, weight in mix]
+    schedule = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        if kind in ('generate', 'download'):
+            spec, valid = make_spec(rng, invalid_rate)
+            schedule.append((kind, 'POST', '/' + kind, json.dumps(spec), 200 if valid else 400))
+        elif kind == 'template':
+            name = rng.choice(TEMPLATES + ('missing',))
+            schedule.append((kind, 'GET', f'/templates/{name}', None, 404 if name == 'missing' else 200))
+        else:
+            schedule.append((kind, 'GET', '/examples', None, 200))
+    return schedule
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(-(-len(sorted_values) * pct // 100), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples, elapsed):
+    """Throughput, latency percentiles (ms) and error rate of (latency, ok) samples"""
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'throughput': round(len(samples) / elapsed, 1) if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'p50': round(percentile(latencies, 50), 2) if latencies else None,
+            'p95': round(percentile(latencies, 95), 2) if latencies else None,
+            'p99': round(percentile(latencies, 99), 2) if latencies else None,
+            'max': round(latencies[-1], 2) if latencies else None,
+        },
+    }
+
+
+def run_load(base_url, schedule, concurrency, duration=None):
+    """Send the schedule from ``concurrency`` threads; returns ({kind: samples}, elapsed seconds)
+
+    Every thread keeps one HTTP connection open. A request counts as an error
+    when the status differs from the expected one or the connection fails.
+    With ``duration`` the schedule is replayed in a loop until time is up.
+    """
+    url = urlsplit(base_url)
+    samples = {}
+    lock = threading.Lock()
+    position = [0]
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    def next_request():
+        with lock:
+            index = position[0]
+            position[0] += 1
+        if deadline is None:
+            return schedule[index] if index < len(schedule) else None
+        return schedule[index % len(schedule)] if time.perf_counter() < deadline else None
+
+    def worker():
+        connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        headers = {'Content-Type': 'application/json'}
+        local = []
+        while True:
+            request = next_request()
+            if request is None:
+                break
+            kind, method, path, body, expected = request
+            began = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == expected
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok = False
+            local.append((kind, time.perf_counter() - began, ok))
+        connection.close()
+        with lock:
+            for kind, latency, ok in local:
+                samples.setdefault(kind, []).append((latency, ok))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def start_local_server():
+    """Serve app.py from a background thread, threaded like ``python app.py``; returns (url, server)"""
+    # Every simulated client shares one address, so the per-client rate limit
+    # would measure itself rather than the application
+    os.environ.setdefault('NREL_JOBGEN_RATE_LIMIT', '0')
+    from werkzeug.serving import make_server
+    from app import app
+
+    # Per-request access logging would dominate the output and the timings
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True)
+    thread.start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+
+def git_commit():
+    """Current commit of the checkout, so results can be lined up with history"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline):
+    """Print per-kind throughput and p95 changes against an earlier result file"""
+    print(f"Compared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp')}):", file=sys.stderr)
+    for kind, result in current['results'].items():
+        before = baseline.get('results', {}).get(kind)
+        if not before:
+            continue
+        throughput = (result['throughput'] / before['throughput'] - 1) * 100 if before['throughput'] else 0.0
+        p95_before, p95 = before['latency_ms']['p95'], result['latency_ms']['p95']
+        latency = (p95 / p95_before - 1) * 100 if p95_before else 0.0
+        print(f"  {kind:10} throughput {throughput:+6.1f}%   p95 {latency:+6.1f}%   "
+              f"error rate {before['error_rate']:.2%} -> {result['error_rate']:.2%}", file=sys.stderr)
+
+
+def print_report(report):
+    print(f"{'kind':10} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}",
+          file=sys.stderr)
+    for kind, result in report['results'].items():
+        latency = result['latency_ms']
+        print(f"{kind:10} {result['requests']:8} {result['throughput']:8.1f} {latency['p50']:8.2f} "
+              f"{latency['p95']:8.2f} {latency['p99']:8.2f} {result['error_rate']:7.2%}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load test the NREL HPC job script generator web application',
+        epilog='Without --url the application is started locally in this process.')
+    parser.add_argument('--url', type=str,
+                        help='Base URL of a running server (default: start app.py locally)')
+    parser.add_argument('--concurrency', '-c', type=int, default=8,
+                        help='Number of concurrent clients (default: 8)')
+    parser.add_argument('--requests', '-n', type=int, default=2000,
+                        help='Number of requests to send (default: 2000)')
+    parser.add_argument('--duration', '-d', type=float,
+                        help='Run for this many seconds instead of a fixed number of requests')
+    parser.add_argument('--mix', type=str, default=DEFAULT_MIX,
+                        help=f'Traffic mix as kind=weight pairs (default: {DEFAULT_MIX})')
+    parser.add_argument('--invalid-rate', type=float, default=0.05,
+                        help='Share of form submissions with mistakes, answered with 400 (default: 0.05)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Seed for the request schedule, identical across runs (default: 1)')
+    parser.add_argument('--warmup', type=int, default=50,
+                        help='Requests sent before measuring (default: 50)')
+    parser.add_argument('--output', '-o', type=str,
+                        help='Write the JSON result to this file (default: stdout)')
+    parser.add_argument('--compare', type=str, metavar='RESULT_JSON',
+                        help='Show changes against an earlier result file')
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        base_url, server = start_local_server()
+
+    try:
+        if args.warmup:
+            run_load(base_url, build_requests(args.warmup, mix, args.seed + 1, args.invalid_rate), args.concurrency)
+        schedule = build_requests(args.requests, mix, args.seed, args.invalid_rate)
+        samples, elapsed = run_load(base_url, schedule, args.concurrency, args.duration)
+    finally:
+        if server:
+            server.shutdown()
+
+    results = {'total': summarize([s for kind in samples.values() for s in kind], elapsed)}
+    for kind, _ in mix:
+        if kind in samples:
+            results[kind] = summarize(samples[kind], elapsed)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'target': args.url or 'local',
+        'python': platform.python_version(),
+        'config': {'concurrency': args.concurrency, 'requests': args.requests, 'duration': args.duration,
+                   'mix': args.mix, 'invalid_rate': args.invalid_rate, 'seed': args.seed},
+        'elapsed_s': round(elapsed, 3),
+        'results': results,
+    }
+
+    print_report(report)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 1 if results['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
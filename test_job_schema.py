@@ -0,0 +1,16 @@
+"""
+NREL HPC Job Script Generator - Schema tests
+"""
+
+from job_registry import get_registry
+from job_schema import JobSpecSchema
+
+SPEC = {'account': 'myproject', 'time': '01:00:00', 'partition': 'short'}
+
+
+def test_valid_cache_does_not_accept_bool_or_float_for_int():
+    schema = JobSpecSchema(get_registry())
+    assert schema.validate(dict(SPEC, nodes=1)) == []
+    for value in (True, 1.0):
+        errors = schema.validate(dict(SPEC, nodes=value))
+        assert [(e['field'], e['code']) for e in errors] == [('nodes', 'type')]